@@ -2,9 +2,16 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.urls import reverse
 import base64
 from django.core.files.base import ContentFile
 
+class UserProfileManager(models.Manager):
+    """Leaves the base64 profile picture out of queries unless asked for"""
+    
+    def get_queryset(self):
+        return super().get_queryset().defer('profile_picture_base64')
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     phone = models.CharField(max_length=15, blank=True, null=True)
@@ -18,23 +25,32 @@ class UserProfile(models.Model):
     # Store image format
     profile_picture_format = models.CharField(max_length=10, blank=True, null=True)
     
+    # Content hash, set once the picture lives in the image blob store
+    profile_picture_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = UserProfileManager()
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
     
     @property
     def has_profile_picture(self):
-        return bool(self.profile_picture_base64)
+        # Moved pictures have a hash; inline ones have a format, which is set
+        # and cleared together with the base64 column and avoids loading it
+        return bool(self.profile_picture_hash or self.profile_picture_format)
     
     def get_profile_picture_url(self):
+        if self.profile_picture_hash:
+            return reverse('product_image', args=[self.profile_picture_hash])
         if self.profile_picture_base64:
             return f"data:image/{self.profile_picture_format or 'jpeg'};base64,{self.profile_picture_base64}"
         return None
     
-    def save_profile_picture(self, image_file):
-        """Save image as base64 string"""
+    def save_profile_picture(self, image_file, image_format=None, save=True):
+        """Save image as base64 string, replacing any picture in the blob store"""
         import base64
         from PIL import Image
         import io
@@ -46,7 +62,9 @@ class UserProfile(models.Model):
         base64_str = base64.b64encode(image_data).decode('utf-8')
         
         # Save format
-        if image_file.name.lower().endswith('.png'):
+        if image_format:
+            format_str = image_format
+        elif image_file.name.lower().endswith('.png'):
             format_str = 'png'
         elif image_file.name.lower().endswith('.jpg') or image_file.name.lower().endswith('.jpeg'):
             format_str = 'jpeg'
@@ -57,13 +75,17 @@ class UserProfile(models.Model):
         
         self.profile_picture_base64 = base64_str
         self.profile_picture_format = format_str
-        self.save()
+        self.profile_picture_hash = None
+        if save:
+            self.save()
     
-    def clear_profile_picture(self):
+    def clear_profile_picture(self, save=True):
         """Remove profile picture"""
         self.profile_picture_base64 = None
         self.profile_picture_format = None
-        self.save()
+        self.profile_picture_hash = None
+        if save:
+            self.save()
 
 class ShippingAddress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='shipping_addresses')
@@ -112,8 +112,7 @@ def profile_update_view(request):
             
             # Handle profile picture removal
             if profile_form.cleaned_data.get('remove_picture'):
-                user_profile.profile_picture_base64 = None
-                user_profile.profile_picture_format = None
+                user_profile.clear_profile_picture(save=False)
             
             # Handle new profile picture upload
             if 'profile_picture' in request.FILES:
@@ -130,12 +129,8 @@ def profile_update_view(request):
                         # Reset file pointer
                         image_file.seek(0)
                         
-                        # Convert to base64
-                        base64_str = base64.b64encode(image_data).decode('utf-8')
-                        
                         # Save to profile
-                        user_profile.profile_picture_base64 = base64_str
-                        user_profile.profile_picture_format = image_format
+                        user_profile.save_profile_picture(image_file, image_format, save=False)
                         
                         messages.success(request, 'Profile picture uploaded successfully!')
                     else:
@@ -144,7 +139,7 @@ def profile_update_view(request):
                         context = {
                             'user_form': user_form,
                             'profile_form': profile_form,
-                            'has_picture': bool(user_profile.profile_picture_base64)
+                            'has_picture': user_profile.has_profile_picture
                         }
                         return render(request, 'accounts/profile_update.html', context)
                         
@@ -154,7 +149,7 @@ def profile_update_view(request):
                     context = {
                         'user_form': user_form,
                         'profile_form': profile_form,
-                        'has_picture': bool(user_profile.profile_picture_base64)
+                        'has_picture': user_profile.has_profile_picture
                     }
                     return render(request, 'accounts/profile_update.html', context)
             
@@ -172,7 +167,7 @@ def profile_update_view(request):
     context = {
         'user_form': user_form,
         'profile_form': profile_form,
-        'has_picture': bool(user_profile.profile_picture_base64)
+        'has_picture': user_profile.has_profile_picture
     }
     return render(request, 'accounts/profile_update.html', context)
 
@@ -7,6 +7,8 @@ from datetime import timedelta
 from orders.models import Order, OrderItem
 from products.models import Product
 from accounts.models import User
+from home.cache import section_stats
+from home.views import HOME_SECTIONS
 
 @staff_member_required
 def admin_dashboard(request):
@@ -31,11 +33,11 @@ def admin_dashboard(request):
     ).aggregate(total=Sum('total'))['total'] or 0
     
     # Product statistics
-    top_products = Product.objects.annotate(
+    top_products = Product.objects.cards().select_related('category').annotate(
         total_sold=Sum('orderitem__quantity')
     ).order_by('-total_sold')[:10]
     
-    low_stock = Product.objects.filter(stock__lt=10, is_active=True)[:10]
+    low_stock = Product.objects.cards().filter(stock__lt=10, is_active=True)[:10]
     
     # User statistics
     total_users = User.objects.count()
@@ -66,6 +68,9 @@ def admin_dashboard(request):
         # Recent data
         'recent_orders': recent_orders,
         
+        # Home page cache
+        'home_cache_stats': section_stats(HOME_SECTIONS),
+        
         # Chart data (simplified)
         'chart_labels': ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
         'chart_data': [100, 150, 200, 180, 250, 300, 280],
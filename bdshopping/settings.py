@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     # Third Party
     'crispy_forms',
     'crispy_bootstrap5',
+    'rest_framework',
     
     # Our Apps
     'home',
@@ -54,6 +55,13 @@ INSTALLED_APPS = [
     'analytics',
 ]
 
+# REST API (read-only catalog, see products/api.py)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+}
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
@@ -114,6 +122,58 @@ if 'DATABASE_URL' in os.environ:
         ssl_require=True
     )
 
+# Cache
+# Local memory per process for development, Redis shared by all workers in production
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bdshopping',
+    }
+}
+
+if 'REDIS_URL' in os.environ:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'KEY_PREFIX': 'bdshopping',
+    }
+
+# The catalog version (products/cache.py) must be the same in every worker
+# or they keep serving listings cached before a change. Without Redis it
+# lives in the database (one small query per read), the table is created
+# by `manage.py migrate`
+CACHES['catalog'] = CACHES['default'] if 'REDIS_URL' in os.environ else {
+    'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+    'LOCATION': 'catalog_cache',
+}
+
+# Seconds a cached product listing page is kept
+CATALOG_LISTING_CACHE_TIMEOUT = 300
+
+# Where carts are kept, see cart/storage.py. The Redis and memory backends
+# copy carts to the database with `manage.py sync_carts`
+CART_STORAGE = os.environ.get('CART_STORAGE', 'cart.storage.DatabaseCartStorage')
+CART_REDIS_URL = os.environ.get('CART_REDIS_URL') or os.environ.get('REDIS_URL')
+
+# Seconds the navbar cart badge is cached, it is also dropped on every cart change
+CART_BADGE_TIMEOUT = 300
+
+# Most quantity changes the cart page may send in one request
+CART_MAX_BATCH_CHANGES = 100
+
+# Ids kept per cached search; later pages are read from the database
+SEARCH_CACHE_MAX_RESULTS = 500
+
+# Home page sections are refreshed in the background after the soft TTL
+# and dropped after the hard TTL
+HOME_CACHE_SOFT_TTL = 60
+HOME_CACHE_HARD_TTL = 3600
+
+# Serve catalog pages from an in-process snapshot of the catalog, see products/snapshot.py
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', 'False') == 'True'
+CATALOG_SNAPSHOT_MAX_PRODUCTS = 20000
+CATALOG_SNAPSHOT_MAX_AGE = 600
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -153,9 +213,6 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
 
-# Session settings for cart
-CART_SESSION_ID = 'cart'
-
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
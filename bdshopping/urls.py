@@ -10,6 +10,7 @@ urlpatterns = [
     path('products/', include('products.urls')),
     path('cart/', include('cart.urls')),
     path('orders/', include('orders.urls')),
+    path('api/', include('products.api_urls')),
     
     # Premium Features
     path('coupons/', include('coupons.urls')),
@@ -4,4 +4,8 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bdshopping.settings')
 
-application = get_wsgi_application()  # এই লাইনটি নিশ্চিত করুন
\ No newline at end of file
+application = get_wsgi_application()  # এই লাইনটি নিশ্চিত করুন
+
+# Build the search suggestion index before the first request needs it
+from products import suggest  # noqa: E402
+suggest.warm_up()
@@ -1,8 +1,32 @@
-from .cart import Cart
+from django.utils.functional import cached_property
+
+from .services import CartTotals, badge_totals
+
+
+class CartBadge:
+    """Navbar cart values, read only when a template uses them"""
+    
+    def __init__(self, request):
+        self.request = request
+    
+    @cached_property
+    def totals(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return CartTotals()
+        return badge_totals(user)
+    
+    def count(self):
+        return self.totals.count
+    
+    def total(self):
+        return self.totals.subtotal
+
 
 def cart_total(request):
-    cart = Cart(request)
+    # Templates call these on first use, pages without the badge pay nothing
+    badge = CartBadge(request)
     return {
-        'cart_total_items': cart.get_total_items(),
-        'cart_total_price': cart.get_total_price(),
-    }
\ No newline at end of file
+        'cart_total_items': badge.count,
+        'cart_total_price': badge.total,
+    }
@@ -0,0 +1,30 @@
+"""
+Management command to copy carts from a write-behind cart storage to the database
+Usage: python manage.py sync_carts [--batch-size 500]
+
+Run it periodically (e.g. every minute from cron) when CART_STORAGE is
+the Redis or memory backend; with the database backend it does nothing.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cart.storage import get_storage, sync_to_database
+
+
+class Command(BaseCommand):
+    help = 'Write the carts that changed in Redis (or memory) to the Cart and CartItem tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Carts per transaction (default: 500)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        storage = get_storage()
+        if not storage.write_behind:
+            self.stdout.write(self.style.WARNING(f'{type(storage).__name__} writes to the database directly'))
+            return
+        synced = sync_to_database(storage, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {synced} carts written to the database'))
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 15:02
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_carts(apps, schema_editor):
+    """Fold the extra carts of a user into their oldest one"""
+    Cart = apps.get_model('cart', 'Cart')
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        Cart.objects.order_by().values('user_id').annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1)
+    )
+    for row in duplicates:
+        kept = {item.product_id: item for item in CartItem.objects.filter(cart_id=row['keep'])}
+        extra = Cart.objects.filter(user_id=row['user_id']).exclude(id=row['keep'])
+        for item in CartItem.objects.filter(cart__in=extra).order_by('added_at', 'id'):
+            if item.product_id in kept:
+                kept[item.product_id].quantity += item.quantity
+                kept[item.product_id].save(update_fields=['quantity'])
+            else:
+                item.cart_id = row['keep']
+                item.save(update_fields=['cart'])
+                kept[item.product_id] = item
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_carts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 15:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Separate from 0002 so the rows it deletes are committed before the
+    # table is altered (PostgreSQL checks foreign keys at commit)
+    dependencies = [
+        ('cart', '0002_merge_duplicate_carts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='cart_one_per_user'),
+        ),
+    ]
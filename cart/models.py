@@ -7,16 +7,25 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        constraints = [
+            # The cart storage creates carts with INSERT ... ON CONFLICT DO NOTHING
+            models.UniqueConstraint(fields=['user'], name='cart_one_per_user'),
+        ]
+    
     def __str__(self):
         return f"Cart of {self.user.username}"
     
+    # One aggregate query each, CartService.totals() reads both at once
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        from .storage import totals_of
+        return totals_of(self.items.all())[0]
     
     @property
     def total_price(self):
-        return sum(item.total_price for item in self.items.all())
+        from .storage import totals_of
+        return totals_of(self.items.all())[1]
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -32,4 +41,4 @@ class CartItem(models.Model):
     
     @property
     def total_price(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.product.price * self.quantity
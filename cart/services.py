@@ -0,0 +1,180 @@
+"""
+The cart of a signed-in user.
+
+Every cart read and change goes through CartService, on top of the
+storage backend in cart/storage.py. totals() is one aggregate query for
+the item count and subtotal with the database backend, and items() loads
+the lines' products with their card columns in one query. The cart
+views, the context processor and order_create all use it.
+
+The navbar badge reads the totals from the cache instead (badge_totals()).
+The entry is stamped with the user's badge version, read before the
+totals were computed, and every change moves the version on once its
+transaction commits. A totals() that raced a change therefore leaves an
+entry that is never served, rather than stale totals for
+CART_BADGE_TIMEOUT seconds.
+"""
+
+from decimal import Decimal
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from products.models import Product
+from .storage import added, get_storage
+
+FREE_SHIPPING_THRESHOLD = Decimal('1000.00')
+SHIPPING_COST = Decimal('60.00')
+
+
+class CartTotals:
+    def __init__(self, count=0, subtotal=Decimal('0.00')):
+        self.count = count
+        self.subtotal = Decimal(subtotal).quantize(Decimal('0.01'))
+
+    @classmethod
+    def of(cls, items):
+        """Totals of already loaded cart lines"""
+        return cls(
+            sum(item.quantity for item in items),
+            sum((item.total_price for item in items), Decimal('0.00')),
+        )
+
+    @property
+    def shipping_cost(self):
+        return Decimal('0.00') if self.subtotal >= FREE_SHIPPING_THRESHOLD else SHIPPING_COST
+
+    @property
+    def total(self):
+        return self.subtotal + self.shipping_cost
+
+    @property
+    def free_shipping_gap(self):
+        """How much more has to be spent for free shipping"""
+        return max(FREE_SHIPPING_THRESHOLD - self.subtotal, Decimal('0.00'))
+
+
+class CartLine:
+    """One product in a cart"""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        return self.product.id
+
+    @property
+    def total_price(self):
+        return self.product.price * self.quantity
+
+
+class CartService:
+    def __init__(self, user, storage=None):
+        self.user = user
+        self.storage = storage or get_storage()
+
+    def totals(self):
+        version = _badge_version(self.user.pk)
+        totals = CartTotals(*self.storage.totals(self.user.pk))
+        _remember_badge(self.user.pk, version, totals)
+        return totals
+
+    def items(self):
+        """Cart lines in the order they were added, with product and category loaded"""
+        quantities = self.storage.lines(self.user.pk)
+        if not quantities:
+            return []
+        products = Product.objects.cards().select_related('category').in_bulk(quantities)
+        return [
+            CartLine(products[product_id], quantity)
+            for product_id, quantity in quantities.items()
+            if product_id in products
+        ]
+
+    def quantity(self, product_id):
+        return self.storage.quantity(self.user.pk, product_id)
+
+    def add(self, product, quantity=1):
+        """Add (or with a negative quantity take away) units, up to the stock.
+
+        Returns (old quantity, new quantity, CartTotals after the change);
+        the totals are read in the same transaction as the change.
+        """
+        with transaction.atomic():
+            old, new = self.storage.add(self.user.pk, product.id, quantity, product.stock)
+            totals = CartTotals(*self.storage.totals(self.user.pk))
+            if new != old:
+                forget_badge(self.user.pk)
+        return old, new, totals
+
+    def set_quantities(self, quantities):
+        """Set several line quantities at once.
+
+        quantities is {product id: quantity}; 0 removes a line and products
+        not in the cart are skipped. An increase stops at the product's
+        stock like add() does. Returns the cart lines after the change.
+        """
+        with transaction.atomic():
+            lines = self.items()
+            changes = {}
+            for line in lines:
+                if line.id in quantities:
+                    quantity = added(line.quantity, quantities[line.id] - line.quantity, line.product.stock)
+                    if quantity != line.quantity:
+                        changes[line.id] = line.quantity = quantity
+            if changes:
+                self.storage.set_quantities(self.user.pk, changes)
+                forget_badge(self.user.pk)
+        return [line for line in lines if line.quantity > 0]
+
+    def remove(self, product_id):
+        with transaction.atomic():
+            self.storage.remove(self.user.pk, product_id)
+            forget_badge(self.user.pk)
+
+    def clear(self):
+        with transaction.atomic():
+            self.storage.clear(self.user.pk)
+            forget_badge(self.user.pk)
+
+
+def _badge_keys(user_id):
+    return f'cart:badge:{user_id}', f'cart:badge:{user_id}:version'
+
+
+def _badge_version(user_id):
+    """The user's current badge version, started if the cache has none"""
+    version_key = _badge_keys(user_id)[1]
+    version = cache.get(version_key)
+    if version is None:
+        # A random token, so an evicted version never matches an old entry
+        cache.add(version_key, uuid4().hex, None)
+        version = cache.get(version_key)
+    return version
+
+
+def _remember_badge(user_id, version, totals):
+    cache.set(
+        _badge_keys(user_id)[0], (version, totals.count, totals.subtotal),
+        getattr(settings, 'CART_BADGE_TIMEOUT', 300),
+    )
+
+
+def badge_totals(user):
+    """CartTotals for the navbar badge, from the cache when possible"""
+    key, version_key = _badge_keys(user.pk)
+    cached = cache.get_many([key, version_key])
+    entry, version = cached.get(key), cached.get(version_key)
+    if entry is not None and version is not None and entry[0] == version:
+        return CartTotals(*entry[1:])
+    return CartService(user).totals()
+
+
+def forget_badge(user_id):
+    """Outdate the cached badge once the current transaction commits"""
+    version_key = _badge_keys(user_id)[1]
+    transaction.on_commit(lambda: cache.set(version_key, uuid4().hex, None))
@@ -0,0 +1,446 @@
+"""
+Where cart lines are kept.
+
+A cart is a mapping of product id to quantity per user, kept by the
+backend named in CART_STORAGE:
+
+* DatabaseCartStorage: the Cart and CartItem tables (the default).
+* RedisCartStorage: one Redis hash per cart, so a click is a single
+  O(1) hash operation. Carts that changed are queued for write-behind.
+* MemoryCartStorage: a dict in the process, for tests and development.
+
+With the Redis and memory backends the tables are a copy for analytics
+and the admin, brought up to date by `python manage.py sync_carts`
+(see sync_to_database()).
+"""
+
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+class CartStorage:
+    """Product id -> quantity per user"""
+
+    # Whether carts live somewhere else and are copied to the tables by sync_to_database()
+    write_behind = False
+
+    def lines(self, user_id):
+        """{product id: quantity}, in the order the products were added"""
+        raise NotImplementedError
+
+    def quantity(self, user_id, product_id):
+        return self.lines(user_id).get(product_id, 0)
+
+    def add(self, user_id, product_id, delta, limit):
+        """Change a quantity by delta, see added().
+
+        Returns (old quantity, new quantity).
+        """
+        raise NotImplementedError
+
+    def set_quantities(self, user_id, quantities):
+        """Set the quantities of lines already in the cart, 0 removes a line.
+
+        quantities is {product id: quantity}; products not in the cart are skipped.
+        """
+        raise NotImplementedError
+
+    def remove(self, user_id, product_id):
+        raise NotImplementedError
+
+    def clear(self, user_id):
+        raise NotImplementedError
+
+    def totals(self, user_id):
+        """(item count, subtotal) at current prices"""
+        from products.models import Product
+
+        lines = self.lines(user_id)
+        if not lines:
+            return 0, Decimal('0.00')
+        prices = dict(Product.objects.filter(id__in=lines).values_list('id', 'price'))
+        count = sum(quantity for product_id, quantity in lines.items() if product_id in prices)
+        subtotal = sum((prices[product_id] * quantity for product_id, quantity in lines.items()
+                        if product_id in prices), Decimal('0.00'))
+        return count, subtotal
+
+    def pop_changed(self, limit):
+        """Up to limit ids of users whose carts changed since the last sync"""
+        return []
+
+    def requeue(self, user_ids):
+        """Mark carts popped by pop_changed() as changed again, their sync failed"""
+
+
+def totals_of(items):
+    """(item count, subtotal) of a CartItem queryset with one aggregate query"""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    totals = items.aggregate(
+        count=Coalesce(Sum('quantity'), 0),
+        subtotal=Coalesce(Sum(F('quantity') * F('product__price'), output_field=money), Decimal('0.00'),
+                          output_field=money),
+    )
+    return totals['count'], totals['subtotal']
+
+
+def added(old, delta, limit):
+    """The quantity after adding delta to old.
+
+    An increase stops at limit but never lowers a quantity that is already
+    above it (the stock fell since); a decrease is not capped. 0 removes
+    the line.
+    """
+    if delta > 0:
+        return max(old, min(old + delta, limit))
+    return max(old + delta, 0)
+
+
+class DatabaseCartStorage(CartStorage):
+    def _items(self, user_id):
+        from .models import CartItem
+        return CartItem.objects.filter(cart__user_id=user_id)
+
+    def lines(self, user_id):
+        return dict(self._items(user_id).order_by('added_at', 'id').values_list('product_id', 'quantity'))
+
+    def quantity(self, user_id, product_id):
+        return self._items(user_id).filter(product_id=product_id).values_list('quantity', flat=True).first() or 0
+
+    # One statement: insert the line, or raise its quantity by delta up to the limit.
+    # No row comes back when the cart does not exist or the line is already at the limit.
+    UPSERT_SQL = """
+        INSERT INTO {item_table} (cart_id, product_id, quantity, added_at)
+        SELECT id, %s, %s, %s FROM {cart_table} WHERE user_id = %s ORDER BY id LIMIT 1
+        ON CONFLICT (cart_id, product_id) DO UPDATE
+        SET quantity = {least}({item_table}.quantity + %s, %s)
+        WHERE {item_table}.quantity < %s
+        RETURNING quantity, added_at = %s
+    """
+
+    def add(self, user_id, product_id, delta, limit):
+        from .models import Cart, CartItem
+
+        connection = connections[CartItem.objects.db]
+        if delta > 0 and limit > 0 and connection.vendor in ('postgresql', 'sqlite'):
+            result = self._upsert(connection, user_id, product_id, delta, limit)
+            if result is not None:
+                return result
+            quantity = self.quantity(user_id, product_id)
+            if quantity:
+                # Already at the limit
+                return quantity, quantity
+            # A customer's first add; two at once both get the same cart
+            Cart.objects.bulk_create([Cart(user_id=user_id)], ignore_conflicts=True)
+            return self._upsert(connection, user_id, product_id, delta, limit)
+        return self._add_locked(user_id, product_id, delta, limit)
+
+    def _upsert(self, connection, user_id, product_id, delta, limit):
+        """(old, new) after the upsert, or None if nothing was written.
+
+        An increment capped at the limit reports old as new - delta.
+        """
+        from .models import Cart, CartItem
+
+        sql = self.UPSERT_SQL.format(
+            item_table=connection.ops.quote_name(CartItem._meta.db_table),
+            cart_table=connection.ops.quote_name(Cart._meta.db_table),
+            least='LEAST' if connection.vendor == 'postgresql' else 'MIN',
+        )
+        # Only a new row gets this added_at, which tells an insert from an update
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [product_id, min(delta, limit), now, user_id, delta, limit, limit, now])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        quantity, inserted = row
+        return (0, quantity) if inserted else (max(quantity - delta, 1), quantity)
+
+    def _add_locked(self, user_id, product_id, delta, limit):
+        from .models import Cart, CartItem
+
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user_id=user_id)
+            item = CartItem.objects.select_for_update().filter(cart=cart, product_id=product_id).first()
+            old = item.quantity if item else 0
+            new = added(old, delta, limit)
+            if new == old:
+                pass
+            elif not new:
+                item.delete()
+            elif item is None:
+                CartItem.objects.create(cart=cart, product_id=product_id, quantity=new)
+            else:
+                item.quantity = new
+                item.save(update_fields=['quantity'])
+        return old, new
+
+    def set_quantities(self, user_id, quantities):
+        from .models import CartItem
+
+        with transaction.atomic():
+            items = list(self._items(user_id).select_for_update().filter(
+                product_id__in=[product_id for product_id, quantity in quantities.items() if quantity > 0],
+            ).only('id', 'product_id', 'quantity'))
+            for item in items:
+                item.quantity = quantities[item.product_id]
+            CartItem.objects.bulk_update(items, ['quantity'])
+            removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+            if removed:
+                self._items(user_id).filter(product_id__in=removed).delete()
+
+    def remove(self, user_id, product_id):
+        self._items(user_id).filter(product_id=product_id).delete()
+
+    def clear(self, user_id):
+        self._items(user_id).delete()
+
+    def totals(self, user_id):
+        return totals_of(self._items(user_id))
+
+
+class MemoryCartStorage(CartStorage):
+    write_behind = True
+
+    def __init__(self):
+        self.carts = {}
+        self.changed = set()
+        self.lock = threading.Lock()
+
+    def lines(self, user_id):
+        return dict(self.carts.get(user_id, {}))
+
+    def add(self, user_id, product_id, delta, limit):
+        with self.lock:
+            cart = self.carts.setdefault(user_id, {})
+            old = cart.get(product_id, 0)
+            new = added(old, delta, limit)
+            if new:
+                cart[product_id] = new
+            else:
+                cart.pop(product_id, None)
+            if new != old:
+                self.changed.add(user_id)
+        return old, new
+
+    def set_quantities(self, user_id, quantities):
+        with self.lock:
+            cart = self.carts.get(user_id, {})
+            for product_id, quantity in quantities.items():
+                if product_id not in cart or cart[product_id] == quantity:
+                    continue
+                if quantity > 0:
+                    cart[product_id] = quantity
+                else:
+                    del cart[product_id]
+                self.changed.add(user_id)
+
+    def remove(self, user_id, product_id):
+        with self.lock:
+            if self.carts.get(user_id, {}).pop(product_id, None) is not None:
+                self.changed.add(user_id)
+
+    def clear(self, user_id):
+        with self.lock:
+            if self.carts.pop(user_id, None):
+                self.changed.add(user_id)
+
+    def pop_changed(self, limit):
+        with self.lock:
+            users = [self.changed.pop() for _ in range(min(limit, len(self.changed)))]
+        return users
+
+    def requeue(self, user_ids):
+        with self.lock:
+            self.changed.update(user_ids)
+
+
+class RedisCartStorage(CartStorage):
+    """cart:<user id> is a hash of product id -> quantity.
+
+    Hash fields keep no order, so the order products were added in is kept
+    by a sequence number per field in a second hash.
+    """
+    write_behind = True
+
+    CHANGED_KEY = 'cart:changed'
+
+    # old = HGET, new = added(old, delta, limit), written back in one step
+    ADD_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+local delta = tonumber(ARGV[2])
+local new
+if delta > 0 then
+    new = math.max(old, math.min(old + delta, tonumber(ARGV[3])))
+else
+    new = math.max(old + delta, 0)
+end
+if new ~= old then
+    if new > 0 then
+        redis.call('HSET', KEYS[1], ARGV[1], new)
+        if old == 0 then
+            redis.call('HSET', KEYS[2], ARGV[1], redis.call('HINCRBY', KEYS[2], '_seq', 1))
+        end
+    else
+        redis.call('HDEL', KEYS[1], ARGV[1])
+        redis.call('HDEL', KEYS[2], ARGV[1])
+    end
+    redis.call('SADD', KEYS[3], ARGV[4])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return {old, new}
+"""
+
+    # ARGV holds user id, TTL, then product id / quantity pairs; only fields already set change
+    SET_SCRIPT = """
+local changed = false
+for i = 3, #ARGV, 2 do
+    if redis.call('HEXISTS', KEYS[1], ARGV[i]) == 1 then
+        if tonumber(ARGV[i + 1]) > 0 then
+            redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+        else
+            redis.call('HDEL', KEYS[1], ARGV[i])
+            redis.call('HDEL', KEYS[2], ARGV[i])
+        end
+        changed = true
+    end
+end
+if changed then
+    redis.call('SADD', KEYS[3], ARGV[1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 0
+"""
+
+    def __init__(self):
+        import redis
+
+        url = getattr(settings, 'CART_REDIS_URL', None) or 'redis://localhost:6379/0'
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = getattr(settings, 'CART_REDIS_TTL', 30 * 24 * 3600)
+        self.add_script = self.redis.register_script(self.ADD_SCRIPT)
+        self.set_script = self.redis.register_script(self.SET_SCRIPT)
+
+    def _keys(self, user_id):
+        return f'cart:{user_id}', f'cart:{user_id}:order'
+
+    def lines(self, user_id):
+        key, order_key = self._keys(user_id)
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(key)
+            pipe.hgetall(order_key)
+            quantities, order = pipe.execute()
+        return {
+            int(product_id): int(quantity)
+            for product_id, quantity in sorted(quantities.items(), key=lambda item: int(order.get(item[0], 0)))
+        }
+
+    def quantity(self, user_id, product_id):
+        return int(self.redis.hget(self._keys(user_id)[0], product_id) or 0)
+
+    def add(self, user_id, product_id, delta, limit):
+        key, order_key = self._keys(user_id)
+        old, new = self.add_script(
+            keys=[key, order_key, self.CHANGED_KEY], args=[product_id, delta, limit, user_id, self.ttl],
+        )
+        return int(old), int(new)
+
+    def set_quantities(self, user_id, quantities):
+        if not quantities:
+            return
+        args = [user_id, self.ttl]
+        for product_id, quantity in quantities.items():
+            args += [product_id, max(quantity, 0)]
+        self.set_script(keys=[*self._keys(user_id), self.CHANGED_KEY], args=args)
+
+    def remove(self, user_id, product_id):
+        key, order_key = self._keys(user_id)
+        with self.redis.pipeline() as pipe:
+            pipe.hdel(key, product_id)
+            pipe.hdel(order_key, product_id)
+            pipe.sadd(self.CHANGED_KEY, user_id)
+            pipe.execute()
+
+    def clear(self, user_id):
+        with self.redis.pipeline() as pipe:
+            pipe.delete(*self._keys(user_id))
+            pipe.sadd(self.CHANGED_KEY, user_id)
+            pipe.execute()
+
+    def pop_changed(self, limit):
+        return [int(user_id) for user_id in self.redis.spop(self.CHANGED_KEY, limit) or []]
+
+    def requeue(self, user_ids):
+        if user_ids:
+            self.redis.sadd(self.CHANGED_KEY, *user_ids)
+
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage():
+    path = getattr(settings, 'CART_STORAGE', 'cart.storage.DatabaseCartStorage')
+    if path not in _storages:
+        with _storages_lock:
+            if path not in _storages:
+                _storages[path] = import_string(path)()
+    return _storages[path]
+
+
+def sync_to_database(storage=None, batch_size=500):
+    """Copy the carts that changed in a write-behind storage to the tables.
+
+    Returns the number of carts written.
+    """
+    storage = storage or get_storage()
+    if not storage.write_behind:
+        return 0
+
+    synced = 0
+    while True:
+        user_ids = storage.pop_changed(batch_size)
+        if not user_ids:
+            return synced
+        try:
+            _write_carts(storage, user_ids)
+        except Exception:
+            # Left for the next run rather than lost until the cart changes again
+            storage.requeue(user_ids)
+            raise
+        synced += len(user_ids)
+
+
+def _write_carts(storage, user_ids):
+    from django.contrib.auth.models import User
+    from products.models import Product
+    from .models import Cart, CartItem
+
+    with transaction.atomic():
+        # Carts of deleted users are dropped instead of failing every run
+        user_ids = list(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+        Cart.objects.bulk_create([Cart(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        carts = {cart.user_id: cart for cart in Cart.objects.filter(user_id__in=user_ids)}
+        all_lines = {user_id: storage.lines(user_id) for user_id in user_ids}
+        # Products deleted since they were put in a cart are left out
+        products = set(Product.objects.filter(
+            id__in={product_id for lines in all_lines.values() for product_id in lines}
+        ).values_list('id', flat=True))
+        for user_id, lines in all_lines.items():
+            cart = carts[user_id]
+            lines = {product_id: quantity for product_id, quantity in lines.items() if product_id in products}
+            CartItem.objects.filter(cart=cart).exclude(product_id__in=lines).delete()
+            CartItem.objects.bulk_create(
+                [CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                 for product_id, quantity in lines.items()],
+                update_conflicts=True, unique_fields=['cart', 'product'], update_fields=['quantity'],
+            )
@@ -1,3 +1,352 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from threading import Barrier, Thread
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.models import Category, Product
+from .models import Cart, CartItem
+from .services import CartService, CartTotals, _badge_version, _remember_badge, badge_totals
+from .storage import DatabaseCartStorage, MemoryCartStorage, sync_to_database
+
+UPSERT_VENDORS = ('postgresql', 'sqlite')
+
+
+class DatabaseCartStorageAddTests(TestCase):
+    """The single statement add of DatabaseCartStorage and the locked path it falls back to"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones', slug='phones')
+        cls.product = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=5)
+        cls.user = User.objects.create_user('buyer')
+
+    def setUp(self):
+        self.storage = DatabaseCartStorage()
+
+    def add(self, delta, limit=5, user=None):
+        return self.storage.add((user or self.user).pk, self.product.pk, delta, limit)
+
+    def test_first_add_creates_one_cart(self):
+        self.assertEqual(self.add(2), (0, 2))
+        self.assertEqual(self.add(1), (2, 3))
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 1)
+
+    def test_one_cart_per_user(self):
+        Cart.objects.create(user=self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+
+    @skipUnless(connection.vendor in UPSERT_VENDORS, 'No upsert for this database')
+    def test_add_is_one_statement(self):
+        self.add(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.add(1), (1, 2))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertIn('ON CONFLICT', sql)
+        self.assertIn('LEAST(' if connection.vendor == 'postgresql' else 'MIN(', sql)
+
+    def test_increase_stops_at_limit(self):
+        self.add(4)
+        self.assertEqual(self.add(3)[1], 5)
+        self.assertEqual(self.add(1), (5, 5))
+        self.assertEqual(self.storage.lines(self.user.pk), {self.product.pk: 5})
+
+    def test_increase_keeps_quantity_above_limit(self):
+        # The stock fell below what is already in the cart
+        self.add(4)
+        self.assertEqual(self.add(1, limit=2), (4, 4))
+        self.assertEqual(self.add(1, limit=0), (4, 4))
+        self.assertEqual(self.storage.quantity(self.user.pk, self.product.pk), 4)
+
+    def test_decrease_is_not_capped(self):
+        self.add(4)
+        self.assertEqual(self.add(-1, limit=1), (4, 3))
+        self.assertEqual(self.add(-5, limit=1), (3, 0))
+        self.assertEqual(self.storage.lines(self.user.pk), {})
+
+    def test_locked_path_matches_upsert(self):
+        other = User.objects.create_user('other')
+        steps = [(3, 5), (1, 5), (4, 5), (1, 2), (-2, 1), (2, 5), (-9, 5), (1, 5)]
+        upsert = [self.add(delta, limit)[1] for delta, limit in steps]
+        with mock.patch.object(connection, 'vendor', 'other'), CaptureQueriesContext(connection) as queries:
+            locked = [self.add(delta, limit, user=other)[1] for delta, limit in steps]
+        self.assertEqual(upsert, locked)
+        self.assertFalse(any('ON CONFLICT' in query['sql'] for query in queries))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'The SQLite test database does not take concurrent writers')
+class ConcurrentAddTests(TransactionTestCase):
+    THREADS = 8
+    CLICKS = 10
+
+    def test_no_increment_is_lost(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=1000)
+        user = User.objects.create_user('buyer')
+        storage = DatabaseCartStorage()
+        barrier = Barrier(self.THREADS)
+        errors = []
+
+        def click():
+            try:
+                barrier.wait()
+                for _ in range(self.CLICKS):
+                    storage.add(user.pk, product.pk, 1, product.stock)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        threads = [Thread(target=click) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Cart.objects.filter(user=user).count(), 1)
+        self.assertEqual(storage.quantity(user.pk, product.pk), self.THREADS * self.CLICKS)
+        # The locked path finds exactly one cart too
+        self.assertEqual(storage.add(user.pk, product.pk, -1, product.stock)[1], self.THREADS * self.CLICKS - 1)
+
+
+class CartServiceTestsMixin:
+    """The same cart behaviour whichever storage holds it"""
+
+    def make_storage(self):
+        raise NotImplementedError
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones', slug='phones')
+        cls.phone = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=3)
+        cls.case = Product.objects.create(category=category, name='Case', slug='case', price=Decimal('9.50'), stock=10)
+        cls.user = User.objects.create_user('buyer')
+
+    def setUp(self):
+        cache.clear()
+        storage = self.make_storage()
+        # badge_totals() builds its own CartService
+        patcher = mock.patch('cart.services.get_storage', return_value=storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = CartService(self.user)
+
+    def test_add_and_decrease(self):
+        old, new, totals = self.service.add(self.phone, 2)
+        self.assertEqual((old, new, totals.count, totals.subtotal), (0, 2, 2, Decimal('200.00')))
+        # A capped increase may report an approximate old quantity, see DatabaseCartStorage._upsert()
+        old, new, totals = self.service.add(self.phone, 5)
+        self.assertEqual((new, totals.count), (3, 3))
+        self.assertLess(old, new)
+        self.assertEqual(self.service.add(self.phone, -1)[:2], (3, 2))
+        self.assertEqual(self.service.add(self.phone, -2)[:2], (2, 0))
+        self.assertEqual(self.service.items(), [])
+
+    def test_increase_never_removes_when_stock_fell(self):
+        self.service.add(self.phone, 3)
+        self.phone.stock = 0
+        self.assertEqual(self.service.add(self.phone, 1)[:2], (3, 3))
+        self.assertEqual(self.service.quantity(self.phone.pk), 3)
+
+    def test_items_in_order_added(self):
+        self.service.add(self.case, 1)
+        self.service.add(self.phone, 1)
+        self.service.add(self.case, 1)
+        lines = self.service.items()
+        self.assertEqual([(line.id, line.quantity) for line in lines], [(self.case.pk, 2), (self.phone.pk, 1)])
+        self.assertEqual(lines[0].total_price, Decimal('19.00'))
+
+    def test_remove_and_clear(self):
+        self.service.add(self.phone, 1)
+        self.service.add(self.case, 1)
+        self.service.remove(self.phone.pk)
+        self.assertEqual([line.id for line in self.service.items()], [self.case.pk])
+        self.service.clear()
+        self.assertEqual(self.service.totals().count, 0)
+
+    def test_set_quantities(self):
+        self.service.add(self.phone, 2)
+        self.service.add(self.case, 2)
+        lines = self.service.set_quantities({self.phone.pk: 9, self.case.pk: 0, 12345: 1})
+        self.assertEqual([(line.id, line.quantity) for line in lines], [(self.phone.pk, 3)])
+        self.assertEqual(self.service.storage.lines(self.user.pk), {self.phone.pk: 3})
+
+    def test_badge_follows_changes(self):
+        self.assertEqual(badge_totals(self.user).count, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.add(self.phone, 2)
+        self.assertEqual(badge_totals(self.user).count, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.set_quantities({self.phone.pk: 1})
+        self.assertEqual(badge_totals(self.user).count, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.remove(self.phone.pk)
+        self.assertEqual(badge_totals(self.user).count, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.add(self.case, 1)
+            self.service.clear()
+        self.assertEqual(badge_totals(self.user).count, 0)
+
+    def test_badge_is_outdated_on_commit(self):
+        self.assertEqual(badge_totals(self.user).count, 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.service.add(self.phone, 2)
+        # Other requests keep the committed badge until the change commits
+        self.assertEqual(badge_totals(self.user).count, 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(badge_totals(self.user).count, 2)
+
+    def test_late_totals_are_not_served(self):
+        # A request reads the version and its totals, then a change commits
+        # before that request writes the badge
+        version = _badge_version(self.user.pk)
+        stale = CartTotals(*self.service.storage.totals(self.user.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.add(self.phone, 2)
+        _remember_badge(self.user.pk, version, stale)
+        self.assertEqual(badge_totals(self.user).count, 2)
+
+    def test_badge_survives_an_evicted_version(self):
+        self.service.totals()
+        cache.delete(f'cart:badge:{self.user.pk}:version')
+        self.service.storage.add(self.user.pk, self.phone.pk, 1, 3)
+        self.assertEqual(badge_totals(self.user).count, 1)
+
+
+class DatabaseCartServiceTests(CartServiceTestsMixin, TestCase):
+    def make_storage(self):
+        return DatabaseCartStorage()
+
+
+class MemoryCartServiceTests(CartServiceTestsMixin, TestCase):
+    def make_storage(self):
+        return MemoryCartStorage()
+
+
+class SyncToDatabaseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones', slug='phones')
+        cls.phone = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=5)
+        cls.case = Product.objects.create(category=category, name='Case', slug='case', price=10, stock=5)
+        cls.user = User.objects.create_user('buyer')
+
+    def setUp(self):
+        self.storage = MemoryCartStorage()
+
+    def rows(self):
+        return set(CartItem.objects.values_list('cart__user_id', 'product_id', 'quantity'))
+
+    def test_copies_changed_carts(self):
+        self.storage.add(self.user.pk, self.phone.pk, 2, 5)
+        self.storage.add(self.user.pk, self.case.pk, 1, 5)
+        self.assertEqual(sync_to_database(self.storage), 1)
+        self.assertEqual(self.rows(), {(self.user.pk, self.phone.pk, 2), (self.user.pk, self.case.pk, 1)})
+
+        self.storage.remove(self.user.pk, self.case.pk)
+        self.storage.add(self.user.pk, self.phone.pk, 1, 5)
+        self.assertEqual(sync_to_database(self.storage), 1)
+        self.assertEqual(self.rows(), {(self.user.pk, self.phone.pk, 3)})
+        self.assertEqual(sync_to_database(self.storage), 0)
+
+    def test_skips_deleted_users(self):
+        self.storage.add(self.user.pk + 1000, self.phone.pk, 1, 5)
+        sync_to_database(self.storage)
+        self.assertEqual(self.rows(), set())
+
+    def test_failed_write_is_requeued(self):
+        self.storage.add(self.user.pk, self.phone.pk, 2, 5)
+        with mock.patch.object(CartItem.objects, 'bulk_create', side_effect=RuntimeError('database gone')):
+            with self.assertRaises(RuntimeError):
+                sync_to_database(self.storage)
+        self.assertEqual(self.rows(), set())
+        self.assertEqual(sync_to_database(self.storage), 1)
+        self.assertEqual(self.rows(), {(self.user.pk, self.phone.pk, 2)})
+
+    def test_database_storage_is_not_synced(self):
+        self.assertEqual(sync_to_database(DatabaseCartStorage()), 0)
+
+
+class CartUpdateManyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones', slug='phones')
+        cls.phone = Product.objects.create(category=category, name='Phone', slug='phone', price=100, stock=3)
+        cls.case = Product.objects.create(category=category, name='Case', slug='case', price=10, stock=10)
+        cls.user = User.objects.create_user('buyer', password='secret')
+        cls.url = reverse('cart_update_many')
+
+    def setUp(self):
+        cache.clear()
+        service = CartService(self.user)
+        service.add(self.phone, 1)
+        service.add(self.case, 2)
+        self.client.force_login(self.user)
+
+    def post(self, body, client=None):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        return (client or self.client).post(self.url, body, content_type='application/json')
+
+    def test_applies_changes_and_returns_cart(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post([
+                {'item_id': self.phone.pk, 'quantity': 9},
+                {'item_id': self.case.pk, 'quantity': 0},
+            ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['items'], [
+            {'item_id': self.phone.pk, 'quantity': 3, 'stock': 3, 'total_price': '300.00'},
+        ])
+        self.assertEqual((data['cart_count'], data['subtotal'], data['total']), (3, '300.00', '360.00'))
+        self.assertEqual(badge_totals(self.user).count, 3)
+
+    def test_invalid_bodies(self):
+        bodies = [
+            'not json',
+            '{"item_id": 1, "quantity": 1}',
+            '[1]',
+            '[{"item_id": %d}]' % self.phone.pk,
+            '[{"item_id": %d, "quantity": -1}]' % self.phone.pk,
+            '[{"item_id": %d, "quantity": 1.5}]' % self.phone.pk,
+            '[{"item_id": %d, "quantity": 1e400}]' % self.phone.pk,
+            '[{"item_id": %d, "quantity": true}]' % self.phone.pk,
+            '[{"item_id": "%d", "quantity": 1}]' % self.phone.pk,
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                response = self.post(body)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(CartService(self.user).quantity(self.phone.pk), 1)
+
+    @override_settings(CART_MAX_BATCH_CHANGES=2)
+    def test_change_cap(self):
+        change = {'item_id': self.phone.pk, 'quantity': 2}
+        self.assertEqual(self.post([change] * 2).status_code, 200)
+        self.assertEqual(self.post([change] * 3).status_code, 400)
+
+    def test_post_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.post([{'item_id': self.phone.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 302)
+
+    def test_csrf_token_required(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        self.assertEqual(self.post([{'item_id': self.phone.pk, 'quantity': 2}], client=client).status_code, 403)
+        self.assertEqual(CartService(self.user).quantity(self.phone.pk), 1)
@@ -4,8 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.cart_detail, name='cart_detail'),
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
-    path('update/<int:item_id>/', views.cart_update, name='cart_update'),
-    path('remove/<int:item_id>/', views.cart_remove, name='cart_remove'),
+    path('update/<int:product_id>/', views.cart_update, name='cart_update'),
+    path('update/', views.cart_update_many, name='cart_update_many'),
+    path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('clear/', views.cart_clear, name='cart_clear'),
     path('summary/', views.cart_summary, name='cart_summary'),
     path('checkout/', views.checkout_view, name='checkout'),
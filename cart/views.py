@@ -1,113 +1,120 @@
+import json
+
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from products.models import Product
-from .models import Cart, CartItem
+from .services import CartService, CartTotals
 
 @login_required
 def cart_detail(request):
     """View cart details"""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
+    service = CartService(request.user)
+    totals = service.totals()
     
     context = {
-        'cart': cart,
-        'cart_items': cart_items,
-        'cart_total': cart.total_price,
-        'cart_count': cart.total_items,
+        'cart_items': service.items(),
+        'totals': totals,
+        'cart_total': totals.subtotal,
+        'cart_count': totals.count,
     }
     return render(request, 'cart/detail.html', context)
 
 @login_required
-def cart_add(request, product_id):
-    """Add product to cart"""
-    product = get_object_or_404(Product, id=product_id, is_active=True)
-    
-    # Check stock
-    if product.stock < 1:
-        messages.error(request, f'Sorry, {product.name} is out of stock!')
-        return redirect('product_detail', product_id=product_id)
-    
-    # Get or create cart
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    
-    # Add item to cart
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        # If already in cart, increase quantity
-        if cart_item.quantity < product.stock:
-            cart_item.quantity += 1
-            cart_item.save()
-            messages.success(request, f'{product.name} quantity increased in cart!')
-        else:
-            messages.warning(request, f'Cannot add more {product.name}. Only {product.stock} available!')
-    else:
-        messages.success(request, f'{product.name} added to cart!')
-    
-    # Check if request is AJAX
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'message': 'Product added to cart',
-            'cart_count': cart.total_items,
-            'cart_total': float(cart.total_price),
-        })
-    
-    # Redirect back to product page or cart
-    redirect_to = request.GET.get('next', 'product_detail')
-    if redirect_to == 'cart':
-        return redirect('cart_detail')
-    else:
-        return redirect('product_detail', product_id=product_id)
-
-@login_required
-def cart_update(request, item_id):
+def cart_update(request, product_id):
     """Update cart item quantity"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    service = CartService(request.user)
+    if not service.quantity(product_id):
+        raise Http404("Product is not in the cart")
+    product = get_object_or_404(Product.objects.only('id', 'name', 'stock'), id=product_id)
     
     if request.method == 'POST':
         action = request.POST.get('action')
         
         if action == 'increase':
-            if cart_item.quantity < cart_item.product.stock:
-                cart_item.quantity += 1
-                cart_item.save()
-                messages.success(request, f'{cart_item.product.name} quantity increased!')
+            old, new, _ = service.add(product, 1)
+            if new > old:
+                messages.success(request, f'{product.name} quantity increased!')
             else:
-                messages.warning(request, f'Cannot add more {cart_item.product.name}. Stock limited!')
+                messages.warning(request, f'Cannot add more {product.name}. Stock limited!')
         
         elif action == 'decrease':
-            if cart_item.quantity > 1:
-                cart_item.quantity -= 1
-                cart_item.save()
-                messages.success(request, f'{cart_item.product.name} quantity decreased!')
+            old, new, _ = service.add(product, -1)
+            if new:
+                messages.success(request, f'{product.name} quantity decreased!')
             else:
-                cart_item.delete()
-                messages.success(request, f'{cart_item.product.name} removed from cart!')
+                messages.success(request, f'{product.name} removed from cart!')
     
     return redirect('cart_detail')
 
 @login_required
-def cart_remove(request, item_id):
+def cart_update_many(request):
+    """Set several quantities at once, for the debounced edits of the cart page.
+
+    The body is a JSON list of {"item_id": product id, "quantity": n};
+    quantity 0 removes the item. Replies with the cart after the change.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=405)
+    quantities = _parse_changes(request.body)
+    if quantities is None:
+        return JsonResponse({'success': False, 'message': 'Invalid changes'}, status=400)
+
+    lines = CartService(request.user).set_quantities(quantities)
+    totals = CartTotals.of(lines)
+    return JsonResponse({
+        'success': True,
+        'items': [
+            {
+                'item_id': line.id,
+                'quantity': line.quantity,
+                'stock': line.product.stock,
+                'total_price': str(line.total_price),
+            }
+            for line in lines
+        ],
+        'cart_count': totals.count,
+        'cart_total': float(totals.subtotal),
+        'subtotal': str(totals.subtotal),
+        'shipping_cost': str(totals.shipping_cost),
+        'total': str(totals.total),
+        'free_shipping_gap': str(totals.free_shipping_gap),
+    })
+
+def _parse_changes(body):
+    """{product id: quantity} from a cart_update_many body, None if it is not valid"""
+    try:
+        changes = json.loads(body)
+    except ValueError:
+        return None
+    if not isinstance(changes, list) or len(changes) > getattr(settings, 'CART_MAX_BATCH_CHANGES', 100):
+        return None
+    quantities = {}
+    for change in changes:
+        if not isinstance(change, dict):
+            return None
+        item_id, quantity = change.get('item_id'), change.get('quantity')
+        # bool is an int too; floats (1.5, 1e400) are refused rather than rounded
+        if any(type(value) is not int for value in (item_id, quantity)) or quantity < 0:
+            return None
+        quantities[item_id] = quantity
+    return quantities
+
+@login_required
+def cart_remove(request, product_id):
     """Remove item from cart"""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
-    product_name = cart_item.product.name
-    cart_item.delete()
-    messages.success(request, f'{product_name} removed from cart!')
+    product = get_object_or_404(Product.objects.only('id', 'name'), id=product_id)
+    CartService(request.user).remove(product.id)
+    messages.success(request, f'{product.name} removed from cart!')
     
     return redirect('cart_detail')
 
 @login_required
 def cart_clear(request):
     """Clear all items from cart"""
-    cart = get_object_or_404(Cart, user=request.user)
-    cart.items.all().delete()
+    CartService(request.user).clear()
     messages.success(request, 'Cart cleared successfully!')
     
     return redirect('cart_detail')
@@ -115,51 +122,41 @@ def cart_clear(request):
 def cart_summary(request):
     """Get cart summary for AJAX requests"""
     if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        totals = CartService(request.user).totals()
         return JsonResponse({
-            'count': cart.total_items,
-            'total': float(cart.total_price),
+            'count': totals.count,
+            'total': float(totals.subtotal),
         })
     return JsonResponse({'count': 0, 'total': 0})
     
 @login_required
 def cart_add(request, product_id):
     """Add product to cart"""
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    product = get_object_or_404(Product.objects.only('id', 'name', 'stock'), id=product_id, is_active=True)
     
     # Check stock
     if product.stock < 1:
         messages.error(request, f'Sorry, {product.name} is out of stock!')
         return redirect('product_detail', product_id=product_id)
     
-    # Get or create cart
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    
-    # Add item to cart
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart,
-        product=product,
-        defaults={'quantity': 1}
-    )
+    # Add item to cart, up to the stock
+    service = CartService(request.user)
+    old, new, totals = service.add(product, 1)
     
-    if not created:
-        # If already in cart, increase quantity
-        if cart_item.quantity < product.stock:
-            cart_item.quantity += 1
-            cart_item.save()
-            messages.success(request, f'{product.name} quantity increased in cart!')
-        else:
-            messages.warning(request, f'Cannot add more {product.name}. Only {product.stock} available!')
-    else:
+    if not old:
         messages.success(request, f'{product.name} added to cart!')
+    elif new > old:
+        messages.success(request, f'{product.name} quantity increased in cart!')
+    else:
+        messages.warning(request, f'Cannot add more {product.name}. Only {product.stock} available!')
     
     # Check if request is AJAX
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
             'message': 'Product added to cart',
-            'cart_count': cart.total_items,
-            'cart_total': float(cart.total_price),
+            'cart_count': totals.count,
+            'cart_total': float(totals.subtotal),
         })
     
     # Redirect back to product page or cart - FIXED
@@ -168,25 +165,7 @@ def cart_add(request, product_id):
         return redirect('cart_detail')
     else:
         return redirect('product_detail', product_id=product_id)  # FIXED: product_id instead of pk
-from django.shortcuts import render, redirect
-from django.contrib.auth.decorators import login_required
 
-@login_required
-def checkout_view(request):
-    """Checkout page"""
-    cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
-    
-    if not cart_items:
-        messages.warning(request, 'Your cart is empty!')
-        return redirect('cart_detail')
-    
-    context = {
-        'cart': cart,
-        'cart_items': cart_items,
-    }
-    return render(request, 'cart/checkout.html', context)
-    
 @login_required
 def checkout_view(request):
     """Simple checkout page"""
@@ -0,0 +1,94 @@
+"""
+Stale-while-revalidate cache for the home page sections.
+
+Each section is cached with a soft and a hard TTL. Until the soft TTL
+passes the entry is fresh. After that, and as soon as the catalog
+version moves, it is still served while a single background thread,
+holding a short cache lock, rebuilds it. Only a request that finds no
+entry at all (past the hard TTL or evicted) builds the section itself.
+
+Hits, stale hits, misses and refresh timings are counted per section in
+the cache so all workers add to the same numbers, see section_stats().
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from products.cache import get_catalog_version
+
+STAT_NAMES = ('hits', 'stale', 'misses', 'refreshes', 'refresh_ms_total', 'refresh_ms_last')
+
+
+def _ttls():
+    soft = getattr(settings, 'HOME_CACHE_SOFT_TTL', 60)
+    hard = getattr(settings, 'HOME_CACHE_HARD_TTL', 3600)
+    return soft, max(hard, soft)
+
+
+def _record(section, stat, amount=1):
+    key = f'home:stats:{section}:{stat}'
+    if stat == 'refresh_ms_last':
+        cache.set(key, amount, None)
+        return
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+def _refresh(section, build):
+    soft_ttl, hard_ttl = _ttls()
+    version = get_catalog_version()
+    started = time.monotonic()
+    value = build()
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    cache.set(f'home:section:{section}', (value, time.time() + soft_ttl, version), hard_ttl)
+    _record(section, 'refreshes')
+    _record(section, 'refresh_ms_total', elapsed_ms)
+    _record(section, 'refresh_ms_last', elapsed_ms)
+    return value
+
+
+def _refresh_in_background(section, build, lock_key):
+    try:
+        _refresh(section, build)
+    finally:
+        cache.delete(lock_key)
+        # The thread opened its own database connection
+        connections.close_all()
+
+
+def cached_section(section, build):
+    """Return the cached value of a home page section, build() makes a fresh one"""
+    entry = cache.get(f'home:section:{section}')
+    if entry is None:
+        _record(section, 'misses')
+        return _refresh(section, build)
+
+    value, refresh_at, version = entry
+    if time.time() < refresh_at and version == get_catalog_version():
+        _record(section, 'hits')
+        return value
+
+    _record(section, 'stale')
+    lock_key = f'home:refreshing:{section}'
+    if cache.add(lock_key, 1, 30):
+        threading.Thread(
+            target=_refresh_in_background, args=(section, build, lock_key), daemon=True
+        ).start()
+    return value
+
+
+def section_stats(sections):
+    """Counters of each section, e.g. {'featured': {'hits': 10, ...}}"""
+    keys = [f'home:stats:{section}:{stat}' for section in sections for stat in STAT_NAMES]
+    values = cache.get_many(keys)
+    return {
+        section: {stat: values.get(f'home:stats:{section}:{stat}', 0) for stat in STAT_NAMES}
+        for section in sections
+    }
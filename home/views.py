@@ -1,19 +1,36 @@
 from django.shortcuts import render
 from products.models import Product, Category
+from products.snapshot import get_snapshot, add_snapshot_headers
+from .cache import cached_section
+
+HOME_SECTIONS = ('featured_products', 'new_arrivals', 'categories')
 
 def home(request):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        context = {
+            'featured_products': snapshot.newest(8, lambda product: product.is_featured),
+            'new_arrivals': snapshot.newest(8),
+            'categories': snapshot.categories[:6],
+        }
+        return add_snapshot_headers(render(request, 'home/index.html', context), snapshot)
+    
     # Get featured products
-    featured_products = Product.objects.filter(is_featured=True)[:8]
+    featured_products = cached_section('featured_products', lambda: list(
+        Product.objects.cards().filter(is_featured=True, is_active=True).order_by('-created_at')[:8]
+    ))
     
     # Get new arrivals
-    new_arrivals = Product.objects.all().order_by('-created_at')[:8]
+    new_arrivals = cached_section('new_arrivals', lambda: list(
+        Product.objects.cards().filter(is_active=True).order_by('-created_at')[:8]
+    ))
     
     # Get categories
-    categories = Category.objects.all()[:6]
+    categories = cached_section('categories', lambda: list(Category.objects.all()[:6]))
     
     context = {
         'featured_products': featured_products,
         'new_arrivals': new_arrivals,
         'categories': categories,
     }
-    return render(request, 'home/index.html', context)
\ No newline at end of file
+    return render(request, 'home/index.html', context)
@@ -3,16 +3,16 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db import transaction
 import uuid
-from cart.cart import Cart
+from cart.services import CartService, CartTotals
 from .models import Order, OrderItem
 from .forms import OrderCreateForm
-from products.models import Product
 
 @login_required
 def order_create(request):
-    cart = Cart(request)
+    cart = CartService(request.user)
+    cart_items = cart.items()
     
-    if len(cart) == 0:
+    if not cart_items:
         messages.warning(request, 'Your cart is empty!')
         return redirect('product_list')
     
@@ -21,30 +21,30 @@ def order_create(request):
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    # Calculate totals
-                    subtotal = cart.get_total_price()
-                    shipping_cost = Decimal('60.00') if subtotal < 1000 else Decimal('0.00')
-                    total = subtotal + shipping_cost
+                    # Calculate totals from the lines being ordered
+                    totals = CartTotals.of(cart_items)
                     
                     # Create order
                     order = form.save(commit=False)
                     order.user = request.user
                     order.order_number = str(uuid.uuid4())[:20].replace('-', '').upper()
-                    order.subtotal = subtotal
-                    order.shipping_cost = shipping_cost
-                    order.total = total
+                    order.subtotal = totals.subtotal
+                    order.shipping_cost = totals.shipping_cost
+                    order.total = totals.total
                     order.save()
                     
                     # Create order items
-                    for item in cart:
-                        OrderItem.objects.create(
+                    OrderItem.objects.bulk_create([
+                        OrderItem(
                             order=order,
-                            product=item['product'],
-                            product_name=item['product'].name,
-                            price=item['price'],
-                            quantity=item['quantity'],
-                            total=item['total_price']
+                            product=item.product,
+                            product_name=item.product.name,
+                            price=item.product.price,
+                            quantity=item.quantity,
+                            total=item.total_price
                         )
+                        for item in cart_items
+                    ])
                     
                     # Clear the cart
                     cart.clear()
@@ -58,20 +58,23 @@ def order_create(request):
     else:
         # Pre-fill form with user data if available
         initial_data = {}
-        if request.user.userprofile.phone:
-            initial_data['shipping_phone'] = request.user.userprofile.phone
-        if request.user.userprofile.address:
-            initial_data['shipping_address'] = request.user.userprofile.address
-        if request.user.userprofile.city:
-            initial_data['shipping_city'] = request.user.userprofile.city
-        if request.user.userprofile.postal_code:
-            initial_data['shipping_postal_code'] = request.user.userprofile.postal_code
+        profile = getattr(request.user, 'profile', None)
+        if profile is not None:
+            if profile.phone:
+                initial_data['shipping_phone'] = profile.phone
+            if profile.address:
+                initial_data['shipping_address'] = profile.address
+            if profile.city:
+                initial_data['shipping_city'] = profile.city
+            if profile.postal_code:
+                initial_data['shipping_postal_code'] = profile.postal_code
         
         form = OrderCreateForm(initial=initial_data)
     
     context = {
         'form': form,
-        'cart': cart,
+        'cart_items': cart_items,
+        'totals': CartTotals.of(cart_items),
     }
     return render(request, 'orders/order_create.html', context)
 
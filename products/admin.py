@@ -1,14 +1,19 @@
-from django.contrib import admin
+import io
+
+from django.contrib import admin, messages
 from django import forms
-from .models import Category, Brand, Product, ProductImage
-import base64
-from PIL import Image
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import Category, Brand, Product, ProductImage, ImageBlob
+from .images import encode_image
+from .feeds import apply_stock_feed, feed_format, read_rows
 
 class ProductAdminForm(forms.ModelForm):
     image_upload = forms.ImageField(
         required=False,
         widget=forms.FileInput(attrs={'class': 'form-control'}),
-        help_text="Upload product image (will be stored as base64 in database)"
+        help_text="Upload product image (stored as base64 with resized WebP/JPEG variants)"
     )
     
     class Meta:
@@ -23,19 +28,9 @@ class ProductAdminForm(forms.ModelForm):
             image_file = self.cleaned_data['image_upload']
             
             try:
-                # Read image file
                 image_data = image_file.read()
-                
-                # Convert to base64
-                base64_str = base64.b64encode(image_data).decode('utf-8')
-                
-                # Determine format
-                format_str = imghdr.what(None, h=image_data)
-                if not format_str:
-                    format_str = 'jpeg'
-                
-                product.image_base64 = base64_str
-                product.image_format = format_str
+                product.image_base64, product.image_format, product.image_hash = encode_image(image_data)
+                ImageBlob.create_variants(product.image_hash, image_data)
             except Exception as e:
                 print(f"Error processing image: {e}")
         
@@ -63,19 +58,9 @@ class ProductImageInlineForm(forms.ModelForm):
             image_file = self.cleaned_data['image_upload']
             
             try:
-                # Read image file
                 image_data = image_file.read()
-                
-                # Convert to base64
-                base64_str = base64.b64encode(image_data).decode('utf-8')
-                
-                # Determine format
-                format_str = imghdr.what(None, h=image_data)
-                if not format_str:
-                    format_str = 'jpeg'
-                
-                product_image.image_base64 = base64_str
-                product_image.image_format = format_str
+                product_image.image_base64, product_image.image_format, product_image.image_hash = encode_image(image_data)
+                ImageBlob.create_variants(product_image.image_hash, image_data)
             except Exception as e:
                 print(f"Error processing image: {e}")
         
@@ -92,8 +77,8 @@ class ProductImageInline(admin.TabularInline):
     readonly_fields = ['preview']
     
     def preview(self, obj):
-        if obj.image_base64:
-            return f'<img src="{obj.get_image_url()}" style="max-width: 100px; max-height: 100px;">'
+        if obj.image_hash:
+            return f'<img src="{obj.get_image_url("preview")}" style="max-width: 100px; max-height: 100px;">'
         return "No image"
     preview.allow_tags = True
 
@@ -110,11 +95,17 @@ class BrandAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'description')
 
+class StockFeedForm(forms.Form):
+    feed = forms.FileField(help_text='CSV or JSONL with slug and any of price, old_price, stock')
+    dry_run = forms.BooleanField(required=False, help_text='Only report what would change')
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     form = ProductAdminForm
+    change_list_template = 'admin/products/product/change_list.html'
     list_display = ('name', 'category', 'price', 'stock', 'is_featured', 'is_active', 'created_at', 'image_preview')
     list_filter = ('category', 'brand', 'is_featured', 'is_active')
+    list_select_related = ('category',)
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductImageInline]
@@ -141,8 +132,37 @@ class ProductAdmin(admin.ModelAdmin):
     )
     
     def image_preview(self, obj):
-        if obj.image_base64:
-            return f'<img src="{obj.get_image_url()}" style="max-width: 150px; max-height: 150px;">'
+        if obj.image_hash:
+            return f'<img src="{obj.get_image_url("preview")}" style="max-width: 150px; max-height: 150px;">'
         return "No image"
     image_preview.allow_tags = True
-    image_preview.short_description = 'Image Preview'
\ No newline at end of file
+    image_preview.short_description = 'Image Preview'
+    
+    def get_urls(self):
+        return [
+            path('stock-feed/', self.admin_site.admin_view(self.stock_feed_view), name='products_product_stock_feed'),
+        ] + super().get_urls()
+    
+    def stock_feed_view(self, request):
+        """Upload a supplier price/stock feed, see products/feeds.py"""
+        if not self.has_change_permission(request):
+            return redirect('admin:products_product_changelist')
+        
+        form = StockFeedForm(request.POST or None, request.FILES or None)
+        summary = None
+        if form.is_valid():
+            upload = form.cleaned_data['feed']
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            summary = apply_stock_feed(read_rows(stream, feed_format(upload.name)), dry_run=form.cleaned_data['dry_run'])
+            level = messages.WARNING if summary.failed else messages.SUCCESS
+            prefix = 'Dry run: ' if form.cleaned_data['dry_run'] else ''
+            self.message_user(request, f'{prefix}{summary}', level)
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Upload price and stock feed',
+            'form': form,
+            'summary': summary,
+        }
+        return TemplateResponse(request, 'admin/products/product/stock_feed.html', context)
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Read-only JSON API for the catalog.
+
+    /api/products/                  cursor paginated, newest first
+    /api/products/<id>/
+    /api/categories/
+    /api/categories/<id>/
+
+Every endpoint takes ?fields=id,name,price to send (and load) only those
+fields. Products can be narrowed with ?category=, ?brand=, ?featured=1
+and ?updated_since=<ISO datetime> for incremental syncs.
+
+Responses carry an ETag and Last-Modified derived from updated_at, and a
+matching If-None-Match or If-Modified-Since is answered with 304 before
+anything is serialized.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from rest_framework import permissions, viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination
+
+from .models import Product, Category
+from .pagination import DEFAULT_PAGE_SIZE
+from .serializers import ProductSerializer, CategorySerializer, requested_fields
+
+
+class CatalogCursorPagination(CursorPagination):
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified for list and detail responses from updated_at"""
+
+    def list_version(self, queryset):
+        """(ETag source, last modified) of a whole list"""
+        state = queryset.order_by().aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        return f"{state['last_modified']}:{state['count']}", state['last_modified']
+
+    def detail_version(self, queryset, pk):
+        updated_at = queryset.filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            raise NotFound()
+        return str(updated_at), updated_at
+
+    def list(self, request, *args, **kwargs):
+        version, last_modified = self.list_version(self.filter_queryset(self.get_queryset()))
+        return self.conditional(request, version, last_modified, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        version, last_modified = self.detail_version(self.get_queryset(), kwargs[self.lookup_field])
+        return self.conditional(request, version, last_modified, super().retrieve, *args, **kwargs)
+
+    def conditional(self, request, version, last_modified, respond, *args, **kwargs):
+        # The same data looks different under other query parameters
+        source = f"{version}:{request.get_full_path()}"
+        etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = respond(request, *args, **kwargs)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class SparseQuerysetMixin:
+    """Load only the columns behind the fields asked for"""
+
+    def sparse(self, queryset):
+        names = requested_fields(self.request)
+        if not names:
+            return queryset
+        columns = self.get_serializer_class().columns_for(names)
+        return queryset.only('id', 'created_at', 'updated_at', *columns)
+
+
+class ProductViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = ProductSerializer
+    pagination_class = CatalogCursorPagination
+    permission_classes = [permissions.AllowAny]
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        queryset = Product.objects.filter(is_active=True).defer('image_base64', 'search_document')
+        params = self.request.query_params
+
+        category = params.get('category', '')
+        if category.isdigit():
+            queryset = queryset.filter(category_id=category)
+        brand = params.get('brand', '')
+        if brand.isdigit():
+            queryset = queryset.filter(brand_id=brand)
+        if params.get('featured') == '1':
+            queryset = queryset.filter(is_featured=True)
+        try:
+            updated_since = parse_datetime(params.get('updated_since', ''))
+        except ValueError:
+            # Well formed but not a real date, e.g. 2024-13-45T00:00:00
+            raise ValidationError({'updated_since': 'Not a valid date and time.'})
+        if updated_since:
+            queryset = queryset.filter(updated_at__gte=updated_since)
+
+        return self.sparse(queryset)
+
+
+class CategoryViewSet(ConditionalGetMixin, SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = CategorySerializer
+    pagination_class = None
+    permission_classes = [permissions.AllowAny]
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        return self.sparse(Category.objects.filter(is_active=True))
+
+    def list_version(self, queryset):
+        # Product counts change without touching updated_at
+        version, last_modified = super().list_version(queryset)
+        counts = list(queryset.order_by('pk').values_list('active_product_count', flat=True))
+        return f"{version}:{counts}", last_modified
+
+    def detail_version(self, queryset, pk):
+        row = queryset.filter(pk=pk).values_list('updated_at', 'active_product_count').first()
+        if row is None:
+            raise NotFound()
+        return str(row), row[0]
@@ -0,0 +1,8 @@
+from rest_framework.routers import DefaultRouter
+from . import api
+
+router = DefaultRouter()
+router.register('products', api.ProductViewSet, basename='api-product')
+router.register('categories', api.CategoryViewSet, basename='api-category')
+
+urlpatterns = router.urls
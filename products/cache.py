@@ -0,0 +1,78 @@
+"""
+Cached product listings.
+
+Listing pages are cached under the catalog version, a counter that every
+Product, Category and Brand save or delete increments. A bump retires
+every cached listing at once without having to know their keys; the old
+entries simply expire. Product card fragments are cached separately per
+product and updated_at (templates/products/includes/product_card.html),
+so they survive the bumps of unrelated products.
+
+The version itself is kept in the 'catalog' cache, which every worker
+shares (Redis, or the database when there is no Redis), so a bump in one
+worker retires the listings cached by all of them. The listings can stay
+in the per-process default cache.
+
+Queryset.update() and bulk_create() skip the signals, call
+bump_catalog_version() after using them on the catalog.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# {% cache %} fragments of a product card, all keyed on (id, updated_at)
+CARD_FRAGMENTS = ('product_card', 'home_featured_card', 'home_new_card')
+
+
+def get_catalog_version():
+    versions = caches['catalog']
+    version = versions.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the clock so an evicted counter never goes back to
+        # a version that may still have listings cached under it
+        versions.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, None)
+        version = versions.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        caches['catalog'].incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def listing_cache_key(name, params, *parts):
+    """Key for one listing page under the current catalog version"""
+    query = urlencode(sorted((key, value) for key, values in params.lists() for value in values))
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return ':'.join(['listing', name, str(get_catalog_version()), *map(str, parts), digest])
+
+
+def cached_listing(key, build):
+    """Return the cached value of key, calling build() to fill it on a miss"""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, getattr(settings, 'CATALOG_LISTING_CACHE_TIMEOUT', 300))
+    return value
+
+
+def forget_product_cards(products):
+    """Drop the cached cards of (id, old updated_at) pairs.
+
+    Their keys change with updated_at anyway, this only frees the space
+    early after bulk changes.
+    """
+    cache.delete_many([
+        make_template_fragment_key(fragment, [product_id, updated_at.timestamp()])
+        for product_id, updated_at in products
+        for fragment in CARD_FRAGMENTS
+    ])
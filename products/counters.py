@@ -0,0 +1,50 @@
+"""
+Denormalized active product counts on Category and Brand.
+
+Product save/delete signals adjust the counters with F() increments;
+reconcile_product_counters() recomputes them from scratch for when they
+drift (bulk updates and raw SQL bypass the signals).
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def counter_state(category_id, brand_id, is_active):
+    """Which category and brand a product counts towards, if any"""
+    if not is_active:
+        return None, None
+    return category_id, brand_id
+
+
+def apply_counter_change(old_state, new_state):
+    """Move one product's contribution from old_state to new_state"""
+    from .models import Category, Brand
+
+    for model, old_id, new_id in (
+        (Category, old_state[0], new_state[0]),
+        (Brand, old_state[1], new_state[1]),
+    ):
+        if old_id == new_id:
+            continue
+        if old_id is not None:
+            model.objects.filter(pk=old_id, active_product_count__gt=0).update(
+                active_product_count=F('active_product_count') - 1
+            )
+        if new_id is not None:
+            model.objects.filter(pk=new_id).update(active_product_count=F('active_product_count') + 1)
+
+
+def reconcile_product_counters():
+    """Recompute every counter with one UPDATE per table"""
+    from .models import Category, Brand, Product
+
+    for model, field in ((Category, 'category'), (Brand, 'brand')):
+        counts = (
+            Product.objects.filter(**{field: OuterRef('pk')}, is_active=True)
+            .order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        model.objects.update(active_product_count=Coalesce(Subquery(counts), 0))
@@ -0,0 +1,143 @@
+"""
+Facet counts for the catalog sidebar.
+
+All facets come from a single grouped query over the search/price
+filtered products, grouped by (category, brand, price bucket, in stock).
+Each facet is then counted in Python with every selection applied
+except its own, so picking a category still shows the other categories
+with their counts.
+"""
+
+from decimal import Decimal
+
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+# (label, min price, max price) - max is exclusive, None is open ended
+PRICE_BUCKETS = [
+    ('Under ৳1,000', None, 1000),
+    ('৳1,000 - ৳5,000', 1000, 5000),
+    ('৳5,000 - ৳20,000', 5000, 20000),
+    ('৳20,000 - ৳50,000', 20000, 50000),
+    ('Over ৳50,000', 50000, None),
+]
+
+# Prices have two decimal places. The max_price filter is inclusive, so a
+# bucket's link asks for up to one step below its exclusive max
+PRICE_STEP = Decimal('0.01')
+
+
+def _price_bucket_expression():
+    whens = []
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        whens.append(When(condition, then=Value(index)))
+    return Case(*whens, output_field=IntegerField())
+
+
+class Facets:
+    def __init__(self, categories, brands, price_ranges, in_stock, total):
+        self.categories = categories
+        self.brands = brands
+        self.price_ranges = price_ranges
+        self.in_stock = in_stock
+        self.total = total
+
+
+def price_bucket(price):
+    """Index into PRICE_BUCKETS of a price, the Python twin of the SQL CASE"""
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        if (low is None or price >= low) and (high is None or price < high):
+            return index
+    return None
+
+
+def facet_rows(queryset):
+    """The grouped query: one row per (category, brand, price bucket, in stock)"""
+    return list(
+        queryset.order_by()
+        .annotate(
+            price_bucket=_price_bucket_expression(),
+            has_stock=Case(When(stock__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField()),
+        )
+        .values('category_id', 'category__name', 'category__slug', 'brand_id', 'brand__name',
+                'price_bucket', 'has_stock')
+        .annotate(count=Count('id'))
+    )
+
+
+def compute_facets(queryset, category_id=None, brand_id=None, in_stock_only=False):
+    """Count categories, brands, price ranges and in-stock products.
+
+    `queryset` must not be filtered by category, brand or stock yet; those
+    selections are passed in so each facet can leave its own one out.
+    """
+    return count_facets(facet_rows(queryset), category_id, brand_id, in_stock_only)
+
+
+def count_facets(rows, category_id=None, brand_id=None, in_stock_only=False):
+    """Count facets from rows shaped like those of facet_rows()"""
+    category_id = _to_int(category_id)
+    brand_id = _to_int(brand_id)
+
+    def matches(row, skip):
+        if skip != 'category' and category_id is not None and row['category_id'] != category_id:
+            return False
+        if skip != 'brand' and brand_id is not None and row['brand_id'] != brand_id:
+            return False
+        if skip != 'stock' and in_stock_only and not row['has_stock']:
+            return False
+        return True
+
+    categories, brands = {}, {}
+    bucket_counts = [0] * len(PRICE_BUCKETS)
+    in_stock = total = 0
+    for row in rows:
+        count = row['count']
+        if matches(row, 'category'):
+            entry = categories.setdefault(row['category_id'], {
+                'id': row['category_id'], 'name': row['category__name'],
+                'slug': row['category__slug'], 'count': 0,
+                'selected': row['category_id'] == category_id,
+            })
+            entry['count'] += count
+        if row['brand_id'] is not None and matches(row, 'brand'):
+            entry = brands.setdefault(row['brand_id'], {
+                'id': row['brand_id'], 'name': row['brand__name'], 'count': 0,
+                'selected': row['brand_id'] == brand_id,
+            })
+            entry['count'] += count
+        if matches(row, 'stock') and row['has_stock']:
+            in_stock += count
+        if matches(row, None):
+            total += count
+            if row['price_bucket'] is not None:
+                bucket_counts[row['price_bucket']] += count
+
+    price_ranges = [
+        {
+            'label': label,
+            'min_price': low,
+            'max_price': high - PRICE_STEP if high is not None else None,
+            'count': bucket_counts[index],
+        }
+        for index, (label, low, high) in enumerate(PRICE_BUCKETS)
+        if bucket_counts[index]
+    ]
+    return Facets(
+        categories=sorted(categories.values(), key=lambda entry: entry['name']),
+        brands=sorted(brands.values(), key=lambda entry: entry['name']),
+        price_ranges=price_ranges,
+        in_stock=in_stock,
+        total=total,
+    )
+
+
+def _to_int(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
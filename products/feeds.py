@@ -0,0 +1,211 @@
+"""
+Reading product feeds, and applying supplier price and stock feeds.
+
+A feed is CSV or JSONL. read_rows() yields (line number, row dict) pairs,
+or (line number, RowError) for lines that cannot be read, without ever
+holding the whole file in memory.
+
+apply_stock_feed() diffs rows keyed by slug against the current price,
+old_price and stock and writes only the products that changed, with
+chunked bulk_update() calls. It bypasses save(), so it does by hand what
+a save would trigger: updated_at moves on the changed rows, their cached
+card fragments are dropped and the catalog version is bumped once.
+"""
+
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_catalog_version, forget_product_cards
+from .models import Product
+
+STOCK_FIELDS = ('price', 'old_price', 'stock')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, file_format):
+    if file_format == 'jsonl':
+        return _read_jsonl(stream)
+    return _read_csv(stream)
+
+
+def _read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _read_jsonl(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, RowError(f'invalid JSON: {e}')
+            continue
+        yield line_number, row if isinstance(row, dict) else RowError('expected a JSON object')
+
+
+def feed_format(filename):
+    return 'jsonl' if filename.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+# Largest value a PositiveIntegerField holds on every database
+MAX_INT = 2147483647
+
+
+def parse_decimal(row, field, required=False):
+    """A Product decimal field of the row, rounded to its decimal places.
+
+    Values that do not fit the column are a RowError rather than failing
+    the whole batch in the database.
+    """
+    model_field = Product._meta.get_field(field)
+    limit = Decimal(10) ** (model_field.max_digits - model_field.decimal_places)
+    value = str(row.get(field) or '').strip().replace(',', '')
+    if not value:
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise RowError(f'{field} "{value}" is not a number')
+    if not number.is_finite() or number < 0 or number >= limit:
+        raise RowError(f'{field} "{value}" is out of range')
+    number = number.quantize(Decimal(1).scaleb(-model_field.decimal_places))
+    if number >= limit:
+        # Rounded up past the limit
+        raise RowError(f'{field} "{value}" is out of range')
+    return number
+
+
+def parse_int(row, field, required=False):
+    value = str(row.get(field) or '').strip()
+    if not value:
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f'{field} "{value}" is not a whole number')
+    if number < 0:
+        raise RowError(f'{field} "{value}" is negative')
+    if number > MAX_INT:
+        raise RowError(f'{field} "{value}" is out of range')
+    return number
+
+
+class FeedSummary:
+    MAX_ERRORS = 100
+
+    def __init__(self):
+        self.rows = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.unknown = 0
+        self.failed = 0
+        self.price_up = 0
+        self.price_down = 0
+        self.sold_out = 0
+        self.restocked = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line_number, message))
+
+    def __str__(self):
+        return (
+            f'{self.rows} rows: {self.changed} changed, {self.unchanged} unchanged, '
+            f'{self.unknown} unknown slugs, {self.failed} failed; '
+            f'{self.price_up} prices up, {self.price_down} down, '
+            f'{self.sold_out} sold out, {self.restocked} back in stock'
+        )
+
+
+def _parse_stock_row(row):
+    slug = str(row.get('slug') or '').strip()
+    if not slug:
+        raise RowError('slug is required')
+    values = {
+        'price': parse_decimal(row, 'price'),
+        'old_price': parse_decimal(row, 'old_price'),
+        'stock': parse_int(row, 'stock'),
+    }
+    # A blank column leaves that value as it is
+    return slug, {field: value for field, value in values.items() if value is not None}
+
+
+def apply_stock_feed(rows, chunk_size=1000, dry_run=False, on_change=None):
+    """Write the price/stock changes in `rows` and return a FeedSummary.
+
+    on_change(slug, old values, new values) is called for every changed
+    product, e.g. to log it.
+    """
+    summary = FeedSummary()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        incoming = {}
+        for line_number, row in chunk:
+            summary.rows += 1
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                slug, values = _parse_stock_row(row)
+            except RowError as e:
+                summary.error(line_number, str(e))
+                continue
+            # The last row for a slug wins
+            incoming[slug] = values
+
+        current = Product.objects.filter(slug__in=incoming).values_list('id', 'slug', 'updated_at', *STOCK_FIELDS)
+        now = timezone.now()
+        changed, touched = [], []
+        found = set()
+        for product_id, slug, updated_at, *old in current:
+            found.add(slug)
+            old = dict(zip(STOCK_FIELDS, old))
+            new = {**old, **incoming[slug]}
+            if new == old:
+                summary.unchanged += 1
+                continue
+
+            summary.changed += 1
+            if new['price'] > old['price']:
+                summary.price_up += 1
+            elif new['price'] < old['price']:
+                summary.price_down += 1
+            if old['stock'] and not new['stock']:
+                summary.sold_out += 1
+            elif not old['stock'] and new['stock']:
+                summary.restocked += 1
+            if on_change:
+                on_change(slug, old, new)
+
+            changed.append(Product(id=product_id, updated_at=now, **new))
+            touched.append((product_id, updated_at))
+        summary.unknown += len(incoming) - len(found)
+
+        if changed and not dry_run:
+            with transaction.atomic():
+                Product.objects.bulk_update(changed, [*STOCK_FIELDS, 'updated_at'])
+            forget_product_cards(touched)
+
+    if summary.changed and not dry_run:
+        bump_catalog_version()
+    return summary
@@ -16,6 +16,7 @@ class ProductFilterForm(forms.Form):
     max_price = forms.DecimalField(max_digits=10, decimal_places=2, required=False)
     sort_by = forms.ChoiceField(
         choices=[
+            ('relevance', 'Best Match'),
             ('newest', 'Newest First'),
             ('price_low', 'Price: Low to High'),
             ('price_high', 'Price: High to Low'),
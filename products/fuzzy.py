@@ -0,0 +1,149 @@
+"""
+In-process trigram index for typo-tolerant product search.
+
+Used where the database has no trigram support (SQLite); PostgreSQL uses
+pg_trgm instead, see search.fuzzy_search_products(). Product names are
+split into words and each word into pg_trgm style trigrams ("  s", " sa",
+"sam", ...). A query term matches a word by the share of the term's
+trigrams the word contains, so "samsng" still finds "Samsung" and
+"iphon" finds "iPhone".
+
+Like the suggestion index, each worker builds it lazily on the first
+fuzzy search, keeps it in step with its own Product saves and rebuilds
+it once it is older than FUZZY_INDEX_TTL seconds.
+"""
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .search import tokenize
+
+MAX_WORDS_PER_NAME = 10
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _words_for(name):
+    return [trigrams(word) for word in tokenize(name)[:MAX_WORDS_PER_NAME]]
+
+
+class TrigramIndex:
+    def __init__(self, max_products):
+        self.max_products = max_products
+        # trigram -> frozenset of product ids, replaced rather than mutated
+        self.postings = {}
+        self.product_words = {}
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def stale(self):
+        ttl = getattr(settings, 'FUZZY_INDEX_TTL', 300)
+        return self.built_at is None or time.monotonic() - self.built_at > ttl
+
+    def build(self):
+        from .models import Product
+
+        postings, product_words = {}, {}
+        products = Product.objects.filter(is_active=True).order_by('-created_at').values_list('id', 'name')
+        for product_id, name in products[:self.max_products].iterator():
+            words = _words_for(name)
+            product_words[product_id] = words
+            for trigram in set().union(*words):
+                postings.setdefault(trigram, set()).add(product_id)
+
+        with self.lock:
+            self.postings = {trigram: frozenset(ids) for trigram, ids in postings.items()}
+            self.product_words = product_words
+            self.built_at = time.monotonic()
+
+    def update_product(self, product_id, name=None, is_active=False):
+        """Replace one product's trigrams; call with is_active=False to drop it"""
+        if self.built_at is None:
+            return
+        with self.lock:
+            old = set().union(*self.product_words.pop(product_id, []))
+            new = set()
+            if is_active and name and len(self.product_words) < self.max_products:
+                words = _words_for(name)
+                self.product_words[product_id] = words
+                new = set().union(*words)
+            for trigram in old - new:
+                self.postings[trigram] = self.postings[trigram] - {product_id}
+            for trigram in new - old:
+                self.postings[trigram] = self.postings.get(trigram, frozenset()) | {product_id}
+
+    def invalidate(self):
+        self.built_at = None
+
+    def search(self, query, threshold, limit):
+        """(product id, similarity) pairs, best first.
+
+        A product's similarity is the mean over the query terms of the
+        best share of the term's trigrams found in one word of its name.
+        """
+        terms = [trigrams(term) for term in tokenize(query)]
+        if not terms:
+            return []
+        postings, product_words = self.postings, self.product_words
+
+        # Trigrams shared with the whole name bound those shared with any
+        # one word, so most candidates are dropped before scoring
+        shared = Counter()
+        for term in terms:
+            for trigram in term:
+                shared.update(postings.get(trigram, ()))
+        total = sum(len(term) for term in terms)
+
+        scored = []
+        for product_id, count in shared.items():
+            if count / total < threshold:
+                continue
+            words = product_words.get(product_id)
+            if not words:
+                continue
+            score = sum(max(len(term & word) for word in words) / len(term) for term in terms) / len(terms)
+            if score >= threshold:
+                scored.append((-score, product_id))
+        scored.sort()
+        return [(product_id, -score) for score, product_id in scored[:limit]]
+
+
+_index = TrigramIndex(max_products=getattr(settings, 'FUZZY_INDEX_MAX_PRODUCTS', 50000))
+_build_lock = threading.Lock()
+
+
+def get_index():
+    if _index.stale:
+        with _build_lock:
+            if _index.stale:
+                _index.build()
+    return _index
+
+
+def similar_products(query, threshold=None, limit=None):
+    """(product id, similarity) pairs of products whose names resemble query"""
+    if threshold is None:
+        threshold = getattr(settings, 'FUZZY_SEARCH_THRESHOLD', 0.6)
+    if limit is None:
+        limit = getattr(settings, 'FUZZY_SEARCH_MAX_RESULTS', 200)
+    return get_index().search(query, threshold, limit)
+
+
+def product_changed(product):
+    _index.update_product(product.pk, product.name, product.is_active)
+
+
+def product_removed(product_id):
+    _index.update_product(product_id)
+
+
+def catalog_changed():
+    """Bulk changes that skip the signals, rebuild on the next fuzzy search"""
+    _index.invalidate()
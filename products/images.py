@@ -0,0 +1,98 @@
+"""
+Helpers for product images stored as base64 in the database.
+
+Images are addressed by the SHA-256 of their raw bytes, so the URL of an
+image changes whenever its content changes and can be cached forever.
+"""
+
+import base64
+import hashlib
+import io
+
+from PIL import Image, ImageOps
+
+
+def hash_image_bytes(image_data):
+    """Return the content hash used to address an image"""
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def get_image_format(image_data):
+    """Detect the image format with Pillow (imghdr is gone in Python 3.13)"""
+    try:
+        img = Image.open(io.BytesIO(image_data))
+        return img.format.lower() if img.format else None
+    except Exception:
+        return None
+
+
+def encode_image(image_data):
+    """Return (base64_str, format_str, image_hash) for raw image bytes"""
+    format_str = get_image_format(image_data) or 'jpeg'
+    base64_str = base64.b64encode(image_data).decode('utf-8')
+    return base64_str, format_str, hash_image_bytes(image_data)
+
+
+def hash_base64_image(base64_str):
+    """Content hash of an image that is already stored as base64"""
+    return hash_image_bytes(base64.b64decode(base64_str))
+
+
+# Named sizes templates can ask for: name -> bounding box in pixels
+IMAGE_VARIANTS = {
+    'preview': (150, 150),
+    'card': (400, 400),
+    'detail': (800, 800),
+    'zoom': (1600, 1600),
+}
+
+# Formats every variant is rendered in, with their Pillow save options
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def render_variant(image, variant, format_str):
+    """Resize an opened Pillow image to a named variant.
+
+    Returns (data, width, height). Images smaller than the bounding box
+    are never upscaled.
+    """
+    resized = image.copy()
+    resized.thumbnail(IMAGE_VARIANTS[variant], Image.LANCZOS)
+    
+    if format_str == 'jpeg' and resized.mode != 'RGB':
+        # JPEG has no alpha channel, flatten onto white
+        rgba = resized.convert('RGBA')
+        resized = Image.new('RGB', rgba.size, (255, 255, 255))
+        resized.paste(rgba, mask=rgba.split()[-1])
+    elif resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA')
+    
+    output = io.BytesIO()
+    resized.save(output, **VARIANT_FORMATS[format_str])
+    return output.getvalue(), resized.width, resized.height
+
+
+# What Pillow raises for bytes it cannot decode
+DECODE_ERRORS = (OSError, ValueError, SyntaxError, Image.DecompressionBombError)
+
+
+def open_image(image_data):
+    """Open and decode image bytes, turned upright by their EXIF orientation"""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(image_data)))
+    image.load()
+    return image
+
+
+def build_variants(image_data):
+    """Render every named variant in every format.
+
+    Yields (variant, format_str, data, width, height) tuples.
+    """
+    image = open_image(image_data)
+    for variant in IMAGE_VARIANTS:
+        for format_str in VARIANT_FORMATS:
+            data, width, height = render_variant(image, variant, format_str)
+            yield variant, format_str, data, width, height
@@ -0,0 +1,67 @@
+"""
+Management command to apply a supplier price and stock feed
+Usage: python manage.py apply_stock_feed feed.csv [--chunk-size 1000] [--dry-run]
+
+The feed is CSV or JSONL with a slug column and any of price, old_price
+and stock; a blank value leaves that field alone. Only products whose
+values actually differ are written, see products/feeds.py.
+"""
+
+import io
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.feeds import apply_stock_feed, feed_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Update price, old_price and stock by slug, writing only the products that changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file, - for stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Rows per lookup and transaction (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report the changes without writing them')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing will be written'))
+
+        path = options['path']
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            stream = open(path, newline='', encoding='utf-8-sig')
+
+        started = time.monotonic()
+        try:
+            summary = apply_stock_feed(
+                read_rows(stream, options['format'] or feed_format(path)),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                on_change=self.report_change if options['verbosity'] > 1 else None,
+            )
+        finally:
+            if path != '-':
+                stream.close()
+
+        for line_number, message in summary.errors:
+            self.stdout.write(self.style.ERROR(f'  line {line_number}: {message}'))
+        if summary.failed > len(summary.errors):
+            self.stdout.write(self.style.ERROR(f'  ... and {summary.failed - len(summary.errors)} more'))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {summary} in {elapsed:.1f}s ({summary.rows / max(elapsed, 0.001):.0f} rows/s)'
+        ))
+
+    def report_change(self, slug, old, new):
+        changes = ', '.join(f'{field} {old[field]} → {new[field]}' for field in old if old[field] != new[field])
+        self.stdout.write(f'  {slug}: {changes}')
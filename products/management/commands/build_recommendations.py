@@ -0,0 +1,123 @@
+"""
+Management command to build "frequently bought together" recommendations
+Usage: python manage.py build_recommendations [--top-k 8] [--rebuild]
+
+Scans OrderItem grouped by order, adds every pair of products bought
+together to the CoPurchase counts and re-ranks the top-K neighbours of
+each product it touched. Only orders after the last processed order id
+are read, so the command is cheap to run from cron.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from products.models import CoPurchase, JobCheckpoint
+
+CHECKPOINT = 'co_purchase'
+
+# Orders younger than this may still be inside an open transaction with a
+# lower id than one already committed, leave them for the next run
+SETTLE_DELAY = timedelta(minutes=5)
+
+
+class Command(BaseCommand):
+    help = 'Update product co-purchase counts from orders placed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=8,
+                            help='Neighbours kept per product (default: 8)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Orders per batch and transaction (default: 1000)')
+        parser.add_argument('--max-items', type=int, default=50,
+                            help='Skip orders with more distinct products than this (default: 50)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Forget all counts and start again from the first order')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            CoPurchase.objects.all().delete()
+            JobCheckpoint.objects.filter(name=CHECKPOINT).delete()
+            self.stdout.write(self.style.WARNING('Cleared co-purchase data'))
+
+        checkpoint, _ = JobCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        orders = Order.objects.exclude(status__in=['cancelled', 'refunded']).filter(
+            created_at__lt=timezone.now() - SETTLE_DELAY
+        )
+        processed = 0
+
+        while True:
+            order_ids = list(
+                orders.filter(id__gt=checkpoint.last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not order_ids:
+                break
+
+            baskets = defaultdict(set)
+            items = OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'product_id')
+            for order_id, product_id in items:
+                baskets[order_id].add(product_id)
+
+            pairs = Counter()
+            for basket in baskets.values():
+                if 1 < len(basket) <= options['max_items']:
+                    pairs.update(permutations(basket, 2))
+
+            with transaction.atomic():
+                self.add_pairs(pairs)
+                self.rank_neighbours({product_id for product_id, _ in pairs}, options['top_k'])
+                checkpoint.last_id = order_ids[-1]
+                checkpoint.save()
+
+            processed += len(order_ids)
+            self.stdout.write(f'  {processed} orders, {len(pairs)} pairs in last batch, up to order #{checkpoint.last_id}')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Processed {processed} new orders'))
+
+    def add_pairs(self, pairs):
+        """Add pair counts, updating rows that exist and creating the rest"""
+        if not pairs:
+            return
+        product_ids = {product_id for product_id, _ in pairs}
+        related_ids = {related_id for _, related_id in pairs}
+        existing = {
+            (row.product_id, row.related_id): row
+            for row in CoPurchase.objects.filter(product_id__in=product_ids, related_id__in=related_ids)
+            .only('id', 'product_id', 'related_id', 'count')
+        }
+
+        to_update, to_create = [], []
+        for (product_id, related_id), count in pairs.items():
+            row = existing.get((product_id, related_id))
+            if row is not None:
+                row.count += count
+                to_update.append(row)
+            else:
+                to_create.append(CoPurchase(product_id=product_id, related_id=related_id, count=count))
+
+        CoPurchase.objects.bulk_update(to_update, ['count'], batch_size=1000)
+        CoPurchase.objects.bulk_create(to_create, batch_size=1000)
+
+    def rank_neighbours(self, product_ids, top_k):
+        """Recompute the top-K ranks of the given products"""
+        if not product_ids:
+            return
+        neighbours = defaultdict(list)
+        rows = CoPurchase.objects.filter(product_id__in=product_ids).values_list('id', 'product_id', 'related_id', 'count', 'rank')
+        for row_id, product_id, related_id, count, rank in rows:
+            neighbours[product_id].append((-count, related_id, row_id, rank))
+
+        changed = []
+        for candidates in neighbours.values():
+            candidates.sort()
+            for position, (_, _, row_id, rank) in enumerate(candidates, start=1):
+                new_rank = position if position <= top_k else None
+                if new_rank != rank:
+                    changed.append(CoPurchase(id=row_id, rank=new_rank))
+
+        CoPurchase.objects.bulk_update(changed, ['rank'], batch_size=1000)
@@ -0,0 +1,274 @@
+"""
+Management command to import products from a CSV or JSONL file
+Usage: python manage.py import_products products.csv [--batch-size 500] [--workers 8] [--create-missing]
+
+Columns / keys: slug, name, description, price, old_price, stock, category,
+brand, is_featured, is_active, image. Only name and price are required;
+the slug defaults to the slugified name and is the key rows are matched
+on, so re-importing a file updates the products it created. category and
+brand are matched on slug or name. image is an http(s) URL or a path
+relative to --image-root.
+
+The file is streamed in batches, so memory use does not grow with its
+size. Each batch is upserted with one bulk_create(update_conflicts=True)
+per column set, and its images are fetched by a pool of worker threads
+into the ImageBlob store. Resized variants are rendered on first request.
+"""
+
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from pathlib import Path
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+from PIL import Image
+
+from products import fuzzy, suggest
+from products.cache import bump_catalog_version
+from products.counters import reconcile_product_counters
+from products.feeds import RowError, feed_format, parse_decimal, parse_int, read_rows
+from products.images import hash_image_bytes
+from products.models import Product, Category, Brand, ImageBlob
+from products.search import build_search_document, index_products
+
+UPDATE_FIELDS = [
+    'name', 'description', 'price', 'old_price', 'stock', 'category', 'brand',
+    'is_featured', 'is_active', 'search_document', 'updated_at',
+]
+IMAGE_FIELDS = ['image_hash', 'image_format', 'image_base64']
+
+SLUG_LENGTH = Product._meta.get_field('slug').max_length
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSONL file into the catalog, creating or updating by slug'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file, - for stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Rows per batch and transaction (default: 500)')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='Parallel image downloads (default: 8)')
+        parser.add_argument('--image-root', default=None,
+                            help='Directory image paths are relative to (default: the file\'s directory)')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Create unknown categories and brands instead of rejecting the row')
+        parser.add_argument('--skip-images', action='store_true',
+                            help='Ignore the image column')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate every row without writing anything')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be at least 1')
+
+        path = options['path']
+        file_format = options['format'] or feed_format(path)
+        self.image_root = Path(options['image_root'] or (Path(path).parent if path != '-' else '.'))
+        self.options = options
+        self.load_lookups()
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing will be written'))
+
+        self.created = self.updated = self.failed = self.images = 0
+        started = time.monotonic()
+
+        if path == '-':
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        else:
+            stream = open(path, newline='', encoding='utf-8-sig')
+        try:
+            rows = read_rows(stream, file_format)
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    self.import_batch(batch, pool)
+
+                    done = self.created + self.updated + self.failed
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(
+                        f'  {done} rows: {self.created} created, {self.updated} updated, {self.failed} failed, '
+                        f'{self.images} images, {done / max(elapsed, 0.001):.0f} rows/s'
+                    )
+        finally:
+            if path != '-':
+                stream.close()
+
+        if not options['dry_run'] and self.created + self.updated:
+            # bulk_create skips the signals that keep these in step
+            reconcile_product_counters()
+            suggest.catalog_changed()
+            fuzzy.catalog_changed()
+            bump_catalog_version()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {self.created} created, {self.updated} updated, {self.failed} failed '
+            f'in {elapsed:.1f}s ({(self.created + self.updated) / max(elapsed, 0.001):.0f} products/s)'
+        ))
+
+    # Categories and brands
+
+    def load_lookups(self):
+        self.categories = {}
+        for category in Category.objects.only('id', 'name', 'slug'):
+            self.categories[category.slug] = self.categories[category.name.lower()] = category
+        self.brands = {}
+        for brand in Brand.objects.only('id', 'name', 'slug'):
+            self.brands[brand.slug] = self.brands[brand.name.lower()] = brand
+
+    def resolve(self, model, lookup, value):
+        value = str(value or '').strip()
+        if not value:
+            return None
+        found = lookup.get(value) or lookup.get(value.lower()) or lookup.get(slugify(value))
+        if found is None:
+            if not self.options['create_missing']:
+                raise RowError(f'unknown {model._meta.verbose_name} "{value}"')
+            found = model(name=value[:100], slug=slugify(value)[:SLUG_LENGTH])
+            if not self.options['dry_run']:
+                found.save()
+            lookup[found.slug] = lookup[value.lower()] = found
+        return found
+
+    # Rows
+
+    def parse_row(self, row):
+        name = str(row.get('name') or '').strip()
+        if not name:
+            raise RowError('name is required')
+        slug = slugify(row.get('slug') or name)[:SLUG_LENGTH]
+        if not slug:
+            raise RowError('slug is empty')
+
+        product = Product(
+            slug=slug,
+            name=name[:200],
+            description=row.get('description') or '',
+            price=parse_decimal(row, 'price', required=True),
+            old_price=parse_decimal(row, 'old_price'),
+            stock=parse_int(row, 'stock') or 0,
+            is_featured=self.boolean(row, 'is_featured', False),
+            is_active=self.boolean(row, 'is_active', True),
+        )
+        category = self.resolve(Category, self.categories, row.get('category'))
+        if category is None:
+            raise RowError('category is required')
+        product.category = category
+        product.brand = self.resolve(Brand, self.brands, row.get('brand'))
+        product.search_document = build_search_document(product)
+        image = '' if self.options['skip_images'] else str(row.get('image') or '').strip()
+        return product, image
+
+    def boolean(self, row, field, default):
+        value = row.get(field)
+        if value in (None, ''):
+            return default
+        return str(value).strip().lower() in TRUE_VALUES
+
+    # Images
+
+    def fetch_image(self, source):
+        """Download or read an image and check it; runs in a worker thread"""
+        if source.startswith(('http://', 'https://')):
+            request = Request(source, headers={'User-Agent': 'bdshopping-import'})
+            with urlopen(request, timeout=30) as response:
+                data = response.read(MAX_IMAGE_BYTES + 1)
+        else:
+            with open(self.image_root / source, 'rb') as image_file:
+                data = image_file.read(MAX_IMAGE_BYTES + 1)
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ValueError('image is larger than 10 MB')
+        with Image.open(io.BytesIO(data)) as img:
+            img.verify()
+            width, height = img.size
+            format_str = (img.format or 'jpeg').lower()
+        return ImageBlob(
+            image_hash=hash_image_bytes(data), variant=ImageBlob.ORIGINAL, format=format_str,
+            data=data, width=width, height=height,
+        )
+
+    def store_images(self, sources, pool):
+        """Fetch every distinct image source of a batch, source -> (hash, format)"""
+        stored = {}
+        futures = {pool.submit(self.fetch_image, source): source for source in sources}
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                blob = future.result()
+            except Exception as e:
+                stored[source] = e
+                continue
+            if not self.options['dry_run']:
+                ImageBlob.objects.bulk_create([blob], ignore_conflicts=True)
+            stored[source] = (blob.image_hash, blob.format)
+            self.images += 1
+        return stored
+
+    # Batches
+
+    def import_batch(self, batch, pool):
+        parsed = {}
+        for line_number, row in batch:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                product, image = self.parse_row(row)
+            except RowError as e:
+                self.row_failed(line_number, e)
+                continue
+            # The last row for a slug wins
+            parsed[product.slug] = (line_number, product, image)
+
+        images = self.store_images({image for _, _, image in parsed.values() if image}, pool)
+        plain, with_image = [], []
+        for line_number, product, image in parsed.values():
+            if not image:
+                plain.append(product)
+                continue
+            result = images[image]
+            if isinstance(result, Exception):
+                # Import the product anyway, keeping any image it already has
+                self.row_failed(line_number, f'image "{image}": {result}', imported=True)
+                plain.append(product)
+                continue
+            product.image_hash, product.image_format = result
+            product.image_base64 = None
+            with_image.append(product)
+
+        if not parsed:
+            return
+        existing = set(Product.objects.filter(slug__in=parsed).values_list('slug', flat=True))
+        self.updated += len(existing)
+        self.created += len(parsed) - len(existing)
+        if self.options['dry_run']:
+            return
+
+        with transaction.atomic():
+            for products, fields in ((plain, UPDATE_FIELDS), (with_image, UPDATE_FIELDS + IMAGE_FIELDS)):
+                if products:
+                    Product.objects.bulk_create(
+                        products, update_conflicts=True, unique_fields=['slug'], update_fields=fields,
+                    )
+            # Not every database hands back the ids of upserted rows
+            ids = dict(Product.objects.filter(slug__in=parsed).values_list('slug', 'id'))
+            for _, product, _ in parsed.values():
+                product.pk = ids[product.slug]
+            index_products([product for _, product, _ in parsed.values()])
+
+    def row_failed(self, line_number, error, imported=False):
+        if not imported:
+            self.failed += 1
+        self.stdout.write(self.style.ERROR(f'  line {line_number}: {error}'))
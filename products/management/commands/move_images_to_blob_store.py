@@ -0,0 +1,120 @@
+"""
+Management command to move base64 images out of the hot tables
+Usage: python manage.py move_images_to_blob_store [--dry-run] [--batch-size 100] [--sleep 0.5]
+
+Rows are streamed in primary-key order, each blob is decoded once and
+written to the ImageBlob table as the 'original' variant, then the text
+column is cleared. Already moved rows have an empty column, so the
+command can be stopped and re-run at any time; --start-after skips
+ahead when resuming a large table.
+"""
+
+import base64
+import binascii
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from accounts.models import UserProfile
+from products.images import DECODE_ERRORS, hash_image_bytes
+from products.models import Product, ProductImage, ImageBlob
+
+# label -> (model, base64 field, format field, hash field)
+SOURCES = {
+    'product': (Product, 'image_base64', 'image_format', 'image_hash'),
+    'productimage': (ProductImage, 'image_base64', 'image_format', 'image_hash'),
+    'userprofile': (UserProfile, 'profile_picture_base64', 'profile_picture_format', 'profile_picture_hash'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Move base64 image columns into the ImageBlob table in resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(SOURCES), action='append',
+                            help='Only process this model (repeatable, default: all)')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Rows per batch and transaction (default: 100)')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches to spare a live database')
+        parser.add_argument('--start-after', type=int, default=0,
+                            help='Resume after this primary key')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Decode and report without writing anything')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing will be written'))
+
+        for label in options['model'] or SOURCES:
+            self.move_model(label, *SOURCES[label], options)
+
+    def move_model(self, label, model, data_field, format_field, hash_field, options):
+        pending = model._default_manager.exclude(**{f'{data_field}__isnull': True}).exclude(**{data_field: ''})
+        total = pending.filter(pk__gt=options['start_after']).count()
+        self.stdout.write(self.style.WARNING(f'{label}: {total} rows with inline images'))
+
+        last_pk = options['start_after']
+        moved = failed = bytes_freed = 0
+        started = time.monotonic()
+
+        while True:
+            rows = list(
+                pending.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', data_field, format_field)[:options['batch_size']]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+
+            blobs, updates = [], []
+            for pk, base64_str, format_str in rows:
+                try:
+                    image_data = base64.b64decode(base64_str, validate=True)
+                    with Image.open(io.BytesIO(image_data)) as img:
+                        width, height = img.size
+                        format_str = format_str or (img.format or 'jpeg').lower()
+                except (binascii.Error, *DECODE_ERRORS) as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'  {label} #{pk}: {e}'))
+                    continue
+
+                image_hash = hash_image_bytes(image_data)
+                blobs.append(ImageBlob(
+                    image_hash=image_hash, variant=ImageBlob.ORIGINAL, format=format_str,
+                    data=image_data, width=width, height=height,
+                ))
+                updates.append((pk, base64_str, image_hash))
+                bytes_freed += len(base64_str)
+
+            if not options['dry_run'] and updates:
+                with transaction.atomic():
+                    ImageBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+                    for pk, base64_str, image_hash in updates:
+                        # Only clear the column if the image was not replaced
+                        # since it was read
+                        model._default_manager.filter(pk=pk, **{data_field: base64_str}).update(
+                            **{data_field: None, hash_field: image_hash}
+                        )
+            moved += len(updates)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'  {label}: {moved + failed}/{total} rows, {moved} moved, {failed} failed, '
+                f'{bytes_freed / 1048576:.1f} MB, {(moved + failed) / max(elapsed, 0.001):.0f} rows/s, '
+                f'last pk {last_pk}'
+            )
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {label}: {moved} images {"would be " if options["dry_run"] else ""}moved, {failed} failed'
+        ))
@@ -0,0 +1,16 @@
+"""
+Management command to recompute Category and Brand product counters
+Usage: python manage.py recount_products
+"""
+
+from django.core.management.base import BaseCommand
+from products.counters import reconcile_product_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute active_product_count on every category and brand'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(self.style.WARNING('Recounting active products...'))
+        reconcile_product_counters()
+        self.stdout.write(self.style.SUCCESS('✅ Category and brand counters reconciled'))
@@ -0,0 +1,16 @@
+"""
+Management command to recompute product rating aggregates from the reviews
+Usage: python manage.py recount_ratings
+"""
+
+from django.core.management.base import BaseCommand
+from products.ratings import reconcile_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_avg, rating_count and rating_histogram on every product'
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(self.style.WARNING('Recounting ratings...'))
+        reconcile_ratings()
+        self.stdout.write(self.style.SUCCESS('✅ Product ratings reconciled'))
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 14:19
+
+import base64
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_image_hashes(apps, schema_editor):
+    for model_name in ('Product', 'ProductImage'):
+        model = apps.get_model('products', model_name)
+        rows = model.objects.exclude(image_base64__isnull=True).exclude(image_base64='')
+        for pk in rows.values_list('pk', flat=True).iterator():
+            image_base64 = model.objects.filter(pk=pk).values_list('image_base64', flat=True).get()
+            image_hash = hashlib.sha256(base64.b64decode(image_base64)).hexdigest()
+            model.objects.filter(pk=pk).update(image_hash=image_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_remove_brand_logo_remove_category_image_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='productimage',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_image_hashes, migrations.RunPython.noop),
+    ]
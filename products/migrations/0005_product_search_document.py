@@ -0,0 +1,51 @@
+# Generated by Django 6.0 on 2026-10-18 14:23
+
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX products_product_search_idx ON products_product "
+            "USING gin (to_tsvector('simple', search_document))"
+        )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE products_product_fts USING fts5("
+            "search_document, tokenize = \"unicode61 remove_diacritics 2 categories 'L* N* Co Mc Mn'\")"
+        )
+
+    Product = apps.get_model('products', 'Product')
+    rows = Product.objects.values_list('pk', 'name', 'brand__name', 'category__name', 'description')
+    for pk, *parts in rows.iterator():
+        document = ' '.join(part for part in parts if part)
+        Product.objects.filter(pk=pk).update(search_document=document)
+        if connection.vendor == 'sqlite':
+            schema_editor.execute(
+                'INSERT INTO products_product_fts (rowid, search_document) VALUES (%s, %s)', (pk, document)
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS products_product_search_idx')
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_imageblob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
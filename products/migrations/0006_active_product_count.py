@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 14:25
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_active_products(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    for model_name, field in (('Category', 'category'), ('Brand', 'brand')):
+        counts = (
+            Product.objects.filter(**{field: OuterRef('pk')}, is_active=True)
+            .order_by()
+            .values(field)
+            .annotate(count=Count('id'))
+            .values('count')
+        )
+        apps.get_model('products', model_name).objects.update(
+            active_product_count=Coalesce(Subquery(counts), 0)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brand',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='active_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_active_products, migrations.RunPython.noop),
+    ]
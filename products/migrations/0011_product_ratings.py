@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 17:40
+
+import products.ratings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_ratings(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('reviews', 'Review')
+    histograms = {}
+    for row in Review.objects.order_by().values('product_id', 'rating').annotate(count=Count('id')):
+        if 1 <= row['rating'] <= 5:
+            histograms.setdefault(row['product_id'], [0] * 5)[row['rating'] - 1] = row['count']
+    for product_id, histogram in histograms.items():
+        rating_avg, rating_count = products.ratings.summarize(histogram)
+        Product.objects.filter(pk=product_id).update(
+            rating_histogram=histogram, rating_avg=rating_avg, rating_count=rating_count,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_trigram_index'),
+        ('reviews', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(default=products.ratings.empty_histogram, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-rating_avg', '-id'], name='product_active_rating_idx'),
+        ),
+        migrations.RunPython(count_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 19:05
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The database cache keeping the catalog version when there is no Redis,
+    # see CACHES['catalog'] in settings. Does nothing for other backends.
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_ratings'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
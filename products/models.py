@@ -1,7 +1,39 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models.functions import Substr
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
 from django.core.validators import MinValueValidator
+from django.urls import reverse
 from django.utils.text import slugify
-import base64
+from .images import encode_image, hash_base64_image, build_variants, open_image, render_variant
+from .search import build_search_document, index_products, unindex_product, refresh_search_documents
+from .counters import counter_state, apply_counter_change
+from .cache import bump_catalog_version
+from .ratings import empty_histogram
+from . import fuzzy, suggest
+
+def sync_image_hash(instance):
+    """Keep image_hash in step with image_base64 when the image is loaded"""
+    if 'image_base64' in instance.get_deferred_fields():
+        return
+    if instance.image_base64:
+        instance.image_hash = hash_base64_image(instance.image_base64)
+
+def image_url(image_hash, variant=None, format_str='jpeg'):
+    """URL of an original image or of one of its named variants"""
+    if not image_hash:
+        return None
+    if variant:
+        return reverse('product_image_variant', args=[image_hash, variant, format_str])
+    return reverse('product_image', args=[image_hash])
+
+def name_changed(instance):
+    """Whether a saved category or brand is being renamed"""
+    if instance.pk is None:
+        return False
+    old_name = type(instance).objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+    return old_name is not None and old_name != instance.name
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -10,6 +42,10 @@ class Category(models.Model):
     icon = models.CharField(max_length=50, default='shopping-bag')
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Maintained by Product signals, see products/counters.py
+    active_product_count = models.PositiveIntegerField(default=0, editable=False)
     
     class Meta:
         verbose_name_plural = 'Categories'
@@ -18,7 +54,10 @@ class Category(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        renamed = name_changed(self)
         super().save(*args, **kwargs)
+        if renamed:
+            refresh_search_documents(self.products.all())
     
     def __str__(self):
         return self.name
@@ -28,14 +67,43 @@ class Brand(models.Model):
     slug = models.SlugField(unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
     
+    # Maintained by Product signals, see products/counters.py
+    active_product_count = models.PositiveIntegerField(default=0, editable=False)
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        renamed = name_changed(self)
         super().save(*args, **kwargs)
+        if renamed:
+            refresh_search_documents(self.product_set.all())
     
     def __str__(self):
         return self.name
 
+# Length of the description excerpt annotated onto product cards
+CARD_SUMMARY_LENGTH = 120
+
+class ProductQuerySet(models.QuerySet):
+    def cards(self):
+        """Columns a product card renders: no image blob, no full description.
+
+        The description is replaced by a short `summary` annotation.
+        """
+        return self.defer('image_base64', 'description').annotate(
+            summary=Substr('description', 1, CARD_SUMMARY_LENGTH)
+        )
+    
+    def with_image(self):
+        """Opt back in to loading every column, image_base64 included"""
+        return self.defer(None)
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
+    """Leaves the base64 image out of every query unless asked for"""
+    
+    def get_queryset(self):
+        return super().get_queryset().defer('image_base64')
+
 class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True)
@@ -48,6 +116,7 @@ class Product(models.Model):
     # Base64 image field (to avoid file system errors)
     image_base64 = models.TextField(blank=True, null=True)
     image_format = models.CharField(max_length=10, blank=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, editable=False)
     
     stock = models.PositiveIntegerField(default=0)
     is_featured = models.BooleanField(default=False)
@@ -55,9 +124,44 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Name, brand, category and description, indexed for full-text search
+    search_document = models.TextField(blank=True, default='', editable=False)
+    
+    # Review aggregates, kept up to date by products/ratings.py
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_histogram = models.JSONField(default=empty_histogram, editable=False)
+    
+    objects = ProductManager()
+    
+    class Meta:
+        # One index per catalog access path, see products/tests.py for the query shapes.
+        # All but the featured one cover active products only and end in id
+        # for the keyset pagination tie-break.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_active_newest_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_price_idx'),
+            models.Index(fields=['name', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_name_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_cat_newest_idx'),
+            models.Index(fields=['category', 'price', 'id'], condition=models.Q(is_active=True),
+                         name='product_cat_price_idx'),
+            models.Index(fields=['brand', '-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_brand_newest_idx'),
+            models.Index(fields=['-rating_avg', '-id'], condition=models.Q(is_active=True),
+                         name='product_active_rating_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True, is_featured=True),
+                         name='product_featured_idx'),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        sync_image_hash(self)
+        self.search_document = build_search_document(self)
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -74,47 +178,182 @@ class Product(models.Model):
     def in_stock(self):
         return self.stock > 0
     
-    def get_image_url(self):
-        """Generate data URL from base64 image"""
-        if self.image_base64 and self.image_format:
-            return f"data:image/{self.image_format};base64,{self.image_base64}"
-        return None
+    @property
+    def rating_stars(self):
+        """rating_avg rounded to whole stars"""
+        return int(self.rating_avg + Decimal('0.5'))
+    
+    def rating_breakdown(self):
+        """(stars, review count, percent of reviews) from 5 stars down"""
+        histogram = self.rating_histogram or empty_histogram()
+        rows = []
+        for stars in range(5, 0, -1):
+            count = histogram[stars - 1]
+            rows.append((stars, count, round(100 * count / self.rating_count) if self.rating_count else 0))
+        return rows
+    
+    def get_image_url(self, variant=None, format_str='jpeg'):
+        """Cacheable URL of the image, addressed by its content hash"""
+        return image_url(self.image_hash, variant, format_str)
     
     def save_image(self, image_file):
         """Save image as base64 string"""
         try:
-            # Read image file
             image_data = image_file.read()
-            
-            # Convert to base64
-            base64_str = base64.b64encode(image_data).decode('utf-8')
-            
-            # Determine format
-            import imghdr
-            format_str = imghdr.what(None, h=image_data)
-            if not format_str:
-                # Default to jpeg
-                format_str = 'jpeg'
-            
-            self.image_base64 = base64_str
-            self.image_format = format_str
+            self.image_base64, self.image_format, self.image_hash = encode_image(image_data)
+            ImageBlob.create_variants(self.image_hash, image_data)
             self.save()
             return True
         except Exception as e:
             print(f"Error saving image: {e}")
             return False
 
+class ProductImageManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().defer('image_base64')
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
     image_base64 = models.TextField(blank=True, null=True)
     image_format = models.CharField(max_length=10, blank=True, null=True)
+    image_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, editable=False)
     is_default = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ProductImageManager()
+    
+    def save(self, *args, **kwargs):
+        sync_image_hash(self)
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"Image for {self.product.name}"
     
-    def get_image_url(self):
-        if self.image_base64 and self.image_format:
-            return f"data:image/{self.image_format};base64,{self.image_base64}"
-        return None
\ No newline at end of file
+    def get_image_url(self, variant=None, format_str='jpeg'):
+        return image_url(self.image_hash, variant, format_str)
+
+
+class ImageBlob(models.Model):
+    """Binary copy of an uploaded image, keyed by the original's hash.
+
+    Holds the resized variants and, once moved out of the base64 columns
+    by the move_images_to_blob_store command, the original itself.
+    """
+    ORIGINAL = 'original'
+    
+    image_hash = models.CharField(max_length=64)
+    variant = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    data = models.BinaryField()
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('image_hash', 'variant', 'format')
+    
+    def __str__(self):
+        return f"{self.variant}.{self.format} of {self.image_hash[:12]}"
+    
+    @classmethod
+    def create_variants(cls, image_hash, image_data):
+        """Render and store every variant of an image once"""
+        if cls.objects.filter(image_hash=image_hash).exclude(variant=cls.ORIGINAL).exists():
+            return
+        cls.objects.bulk_create(
+            [
+                cls(image_hash=image_hash, variant=variant, format=format_str,
+                    data=data, width=width, height=height)
+                for variant, format_str, data, width, height in build_variants(image_data)
+            ],
+            ignore_conflicts=True,
+        )
+    
+    @classmethod
+    def create_variant(cls, image_hash, image_data, variant, format_str):
+        """Render and store one variant of an image, returns its bytes"""
+        data, width, height = render_variant(open_image(image_data), variant, format_str)
+        cls.objects.bulk_create(
+            [cls(image_hash=image_hash, variant=variant, format=format_str,
+                 data=data, width=width, height=height)],
+            ignore_conflicts=True,
+        )
+        return data
+
+
+class CoPurchase(models.Model):
+    """How often two products were bought in the same order.
+
+    Rows for a product's top neighbours carry their rank (1 = bought
+    together most often), the rest keep rank empty. Built by the
+    build_recommendations command.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchases')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='co_purchased_by')
+    count = models.PositiveIntegerField(default=0)
+    rank = models.PositiveSmallIntegerField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('product', 'related')
+        indexes = [models.Index(fields=['product', 'rank'])]
+    
+    def __str__(self):
+        return f"{self.product_id} + {self.related_id} ({self.count})"
+
+class JobCheckpoint(models.Model):
+    """Where an incremental batch job stopped, by primary key"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+# Keep the SQLite full-text index and the suggestion and fuzzy indexes in step with products
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, using='default', **kwargs):
+    if not raw:
+        index_products([instance], using=using)
+        suggest.product_changed(instance)
+        fuzzy.product_changed(instance)
+
+@receiver(post_delete, sender=Product)
+def unindex_deleted_product(sender, instance, using='default', **kwargs):
+    unindex_product(instance.pk, using=using)
+    suggest.product_removed(instance.pk)
+    fuzzy.product_removed(instance.pk)
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+def refresh_suggestions(sender, **kwargs):
+    suggest.catalog_changed()
+
+# Keep Category and Brand active_product_count in step with products
+@receiver(pre_save, sender=Product)
+def remember_counted_state(sender, instance, raw=False, using='default', **kwargs):
+    old = None
+    if instance.pk is not None and not raw:
+        old = sender._base_manager.using(using).filter(pk=instance.pk).values_list(
+            'category_id', 'brand_id', 'is_active'
+        ).first()
+    instance._counted_state = counter_state(*old) if old else (None, None)
+
+@receiver(post_save, sender=Product)
+def update_product_counters(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    new_state = counter_state(instance.category_id, instance.brand_id, instance.is_active)
+    apply_counter_change(getattr(instance, '_counted_state', (None, None)), new_state)
+    instance._counted_state = new_state
+
+@receiver(post_delete, sender=Product)
+def release_product_counters(sender, instance, **kwargs):
+    old_state = counter_state(instance.category_id, instance.brand_id, instance.is_active)
+    apply_counter_change(old_state, (None, None))
+
+# Retire cached listing pages whenever the catalog changes
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Brand)
+def bump_listing_version(sender, **kwargs):
+    bump_catalog_version()
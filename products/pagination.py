@@ -0,0 +1,117 @@
+"""
+Keyset (seek) pagination for product listings.
+
+Instead of OFFSET, each page continues after the sort value and id of
+the last row of the previous page, so page 500 costs the same as page 1.
+Cursors are opaque url-safe tokens that also record the sort order they
+belong to; a cursor from another sort order starts over at page one.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+# sort_by value -> (field or annotation, descending)
+SORT_ORDERS = {
+    'newest': ('created_at', True),
+    'price_low': ('price', False),
+    'price_high': ('price', True),
+    'name': ('name', False),
+    'rating': ('rating_avg', True),
+    'relevance': ('search_rank', True),
+}
+
+DEFAULT_PAGE_SIZE = 24
+
+
+def encode_cursor(sort_by, value, pk):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps([sort_by, value, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort_by):
+    """Return (value, pk) of a cursor, or None if it is invalid or belongs to another sort"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, pk = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if cursor_sort != sort_by or not isinstance(pk, int):
+        return None
+
+    field, _ = SORT_ORDERS[sort_by]
+    try:
+        if field == 'created_at':
+            value = datetime.fromisoformat(value)
+        elif field in ('price', 'rating_avg'):
+            value = Decimal(value)
+        elif field == 'search_rank':
+            value = float(value)
+        elif not isinstance(value, str):
+            return None
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return value, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Paginate a queryset by (sort field, id), ties broken on id"""
+
+    def __init__(self, queryset, sort_by, per_page=DEFAULT_PAGE_SIZE):
+        if sort_by not in SORT_ORDERS:
+            sort_by = 'newest'
+        self.queryset = queryset
+        self.sort_by = sort_by
+        self.per_page = per_page
+        self.field, self.descending = SORT_ORDERS[sort_by]
+
+    def ordered(self):
+        if self.descending:
+            return self.queryset.order_by(f'-{self.field}', '-id')
+        return self.queryset.order_by(self.field, 'id')
+
+    def after(self, cursor=None):
+        """Ordered queryset of the rows that follow a cursor"""
+        queryset = self.ordered()
+        position = decode_cursor(cursor, self.sort_by) if cursor else None
+        if position is not None:
+            value, pk = position
+            if self.descending:
+                queryset = queryset.filter(Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'id__lt': pk}))
+            else:
+                queryset = queryset.filter(Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'id__gt': pk}))
+        return queryset
+
+    def page(self, cursor=None):
+        # One extra row tells whether another page follows
+        rows = list(self.after(cursor)[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            last = rows[-1]
+            next_cursor = encode_cursor(self.sort_by, getattr(last, self.field), last.pk)
+        return KeysetPage(rows, next_cursor)
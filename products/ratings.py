@@ -0,0 +1,89 @@
+"""
+Denormalized review aggregates on Product.
+
+rating_histogram holds the number of 1 to 5 star reviews, and rating_count
+and rating_avg are derived from it. change_rating() adjusts them in the
+transaction that writes the review, with the product row locked so two
+reviews saved at once can't lose an update. reconcile_ratings()
+recomputes them from the reviews for when they drift.
+
+The update skips the Product save signals, so it moves updated_at and
+bumps the catalog version itself: cached cards show the new rating and
+rating-sorted listings are rebuilt.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .cache import bump_catalog_version
+
+STARS = range(1, 6)
+
+
+def empty_histogram():
+    return [0] * len(STARS)
+
+
+def summarize(histogram):
+    """(rating_avg, rating_count) of a histogram"""
+    count = sum(histogram)
+    if not count:
+        return Decimal('0.00'), 0
+    total = sum(stars * histogram[stars - 1] for stars in STARS)
+    return (Decimal(total) / count).quantize(Decimal('0.01')), count
+
+
+def _write(product_id, histogram):
+    from .models import Product
+
+    rating_avg, rating_count = summarize(histogram)
+    Product.objects.filter(pk=product_id).update(
+        rating_histogram=histogram, rating_avg=rating_avg, rating_count=rating_count,
+        updated_at=timezone.now(),
+    )
+
+
+def change_rating(product_id, old_rating=None, new_rating=None):
+    """Move one review's rating from old_rating to new_rating, either may be None"""
+    from .models import Product
+
+    # Ratings saved before they were validated may be out of range
+    old_rating = old_rating if old_rating in STARS else None
+    new_rating = new_rating if new_rating in STARS else None
+    if old_rating == new_rating:
+        return
+    with transaction.atomic():
+        product = Product.objects.select_for_update().filter(pk=product_id).only('rating_histogram').first()
+        if product is None:
+            # Reviews deleted along with their product
+            return
+        histogram = list(product.rating_histogram or empty_histogram())
+        if old_rating is not None:
+            histogram[old_rating - 1] = max(histogram[old_rating - 1] - 1, 0)
+        if new_rating is not None:
+            histogram[new_rating - 1] += 1
+        _write(product_id, histogram)
+        transaction.on_commit(bump_catalog_version)
+
+
+def reconcile_ratings():
+    """Recompute the aggregates of every product from its reviews"""
+    from .models import Product
+
+    Review = Product._meta.get_field('reviews').related_model
+    histograms = {}
+    counts = Review.objects.order_by().values('product_id', 'rating').annotate(count=Count('id'))
+    for row in counts:
+        if row['rating'] in STARS:
+            histograms.setdefault(row['product_id'], empty_histogram())[row['rating'] - 1] = row['count']
+
+    stale = Product.objects.exclude(rating_count=0).exclude(pk__in=histograms).values_list('pk', flat=True)
+    with transaction.atomic():
+        for product_id in stale:
+            _write(product_id, empty_histogram())
+        for product_id, histogram in histograms.items():
+            _write(product_id, histogram)
+    bump_catalog_version()
@@ -0,0 +1,174 @@
+"""
+Full-text product search.
+
+Every product carries a denormalized `search_document` (name, brand,
+category and description) that is indexed per database backend:
+
+* PostgreSQL: a GIN index on to_tsvector('simple', search_document),
+  maintained by the database itself.
+* SQLite: an FTS5 table keyed by product id, maintained from the
+  Product save/delete signals.
+
+Any other backend falls back to icontains on the search document.
+
+When a search finds nothing, fuzzy_search_products() retries it with
+typo-tolerant matching on product names: pg_trgm word similarity on
+PostgreSQL (a GIN trigram index on lower(name)), the in-process trigram
+index of products/fuzzy.py elsewhere.
+"""
+
+import re
+
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_product_fts'
+
+# Word characters plus the Bengali block, whose vowel signs are not \w
+TOKEN_RE = re.compile(r'[\wঀ-৿]+')
+
+# Cap the number of terms so a pasted paragraph can't build a huge query
+MAX_TERMS = 8
+
+
+def tokenize(query):
+    return TOKEN_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+def build_search_document(product):
+    """Text indexed for a product: name, brand, category and description"""
+    parts = [
+        product.name,
+        product.brand.name if product.brand_id else '',
+        product.category.name if product.category_id else '',
+        product.description or '',
+    ]
+    return ' '.join(part for part in parts if part)
+
+
+def _has_fts_table(connection):
+    if not hasattr(connection, '_product_fts_available'):
+        connection._product_fts_available = FTS_TABLE in connection.introspection.table_names()
+    return connection._product_fts_available
+
+
+def search_products(queryset, query):
+    """Filter a Product queryset to matches of `query`, annotated with `search_rank`.
+
+    Every term must match, and the last one is matched as a prefix so
+    results show up while the customer is still typing.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return queryset.annotate(search_rank=models.Value(0.0, output_field=models.FloatField()))
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(terms) + ':*'
+        vector = f"to_tsvector('simple', \"{table}\".\"search_document\")"
+        return queryset.filter(
+            RawSQL(f"{vector} @@ to_tsquery('simple', %s)", (tsquery,), output_field=models.BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank({vector}, to_tsquery('simple', %s))", (tsquery,),
+                               output_field=models.FloatField())
+        )
+
+    if connection.vendor == 'sqlite' and _has_fts_table(connection):
+        match = ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        ).annotate(
+            # bm25() is lower for better matches
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+                (match,), output_field=models.FloatField(),
+            )
+        )
+
+    for term in terms:
+        queryset = queryset.filter(search_document__icontains=term)
+    return queryset.annotate(search_rank=models.Value(0.0, output_field=models.FloatField()))
+
+
+def fuzzy_search_products(queryset, query):
+    """Filter a Product queryset to names similar to `query`, annotated with `search_rank`.
+
+    search_rank is the similarity, from 0 to 1.
+    """
+    terms = tokenize(query)
+    no_matches = queryset.none().annotate(search_rank=models.Value(0.0, output_field=models.FloatField()))
+    if not terms:
+        return no_matches
+
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+
+    if connection.vendor == 'postgresql':
+        text = ' '.join(terms)
+        name = f'lower("{table}"."name")'
+        # <% is word_similarity() above pg_trgm.word_similarity_threshold, served by the trigram index
+        return queryset.filter(
+            RawSQL(f'%s <%% {name}', (text,), output_field=models.BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f'word_similarity(%s, {name})', (text,), output_field=models.FloatField())
+        )
+
+    from .fuzzy import similar_products
+
+    matches = similar_products(query)
+    if not matches:
+        return no_matches
+    return queryset.filter(id__in=[product_id for product_id, _ in matches]).annotate(
+        search_rank=models.Case(
+            *[models.When(id=product_id, then=models.Value(score)) for product_id, score in matches],
+            default=models.Value(0.0),
+            output_field=models.FloatField(),
+        )
+    )
+
+
+def index_products(products, using='default'):
+    """Write products' current search documents to the SQLite FTS table"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not _has_fts_table(connection):
+        return
+    rows = [(product.pk, product.search_document) for product in products]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk, _ in rows])
+        cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, search_document) VALUES (%s, %s)', rows)
+
+
+def unindex_product(product_id, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not _has_fts_table(connection):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (product_id,))
+
+
+def refresh_search_documents(queryset, batch_size=500):
+    """Rebuild the search document of every product in a queryset.
+
+    Used when a category or brand is renamed, since the new name has to
+    reach every product that embeds it.
+    """
+    batch = []
+    products = queryset.select_related('category', 'brand').only(
+        'id', 'name', 'description', 'search_document', 'category__name', 'brand__name'
+    )
+    for product in products.iterator(chunk_size=batch_size):
+        product.search_document = build_search_document(product)
+        batch.append(product)
+        if len(batch) >= batch_size:
+            _write_documents(queryset.model, batch, queryset.db)
+            batch = []
+    if batch:
+        _write_documents(queryset.model, batch, queryset.db)
+
+
+def _write_documents(model, products, using):
+    model._default_manager.db_manager(using).bulk_update(products, ['search_document'])
+    index_products(products, using=using)
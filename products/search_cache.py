@@ -0,0 +1,113 @@
+"""
+Cached search results for product_list.
+
+A search is cached under its normalized terms and filters, so
+"Samsung  Galaxy!" and "samsung galaxy" share an entry and every page of
+a search reads the same one. The entry holds the ordered ids with their
+sort values (up to SEARCH_CACHE_MAX_RESULTS) and the facet counts, and
+goes stale with the catalog version.
+
+Pages hydrate only the products they show, from the per-product card
+cache, so a popular search is answered without touching the database.
+Cursors are the same as KeysetPaginator's; paging past the cached ids
+continues in the database.
+"""
+
+import hashlib
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import get_catalog_version
+from .models import Product
+from .pagination import DEFAULT_PAGE_SIZE, SORT_ORDERS, KeysetPage, decode_cursor, encode_cursor
+from .search import tokenize
+
+
+def _timeout():
+    return getattr(settings, 'CATALOG_LISTING_CACHE_TIMEOUT', 300)
+
+
+def normalize_price(value):
+    """A price filter as a Decimal, or None if missing or not a number"""
+    try:
+        price = Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+    return price if price is not None and price.is_finite() else None
+
+
+def search_cache_key(query, params, sort_by):
+    min_price = normalize_price(params.get('min_price'))
+    max_price = normalize_price(params.get('max_price'))
+    normalized = {
+        'terms': tokenize(query),
+        'min_price': str(min_price.normalize()) if min_price is not None else None,
+        'max_price': str(max_price.normalize()) if max_price is not None else None,
+        'category': params.get('category', '') if params.get('category', '').isdigit() else None,
+        'brand': params.get('brand', '') if params.get('brand', '').isdigit() else None,
+        'in_stock': params.get('in_stock') == '1',
+        'sort_by': sort_by,
+    }
+    digest = hashlib.md5(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+    return f'search:{get_catalog_version()}:{digest}'
+
+
+class SearchResults:
+    def __init__(self, sort_by, rows, facets, truncated, fuzzy=False):
+        self.sort_by = sort_by
+        # (id, sort value) in display order
+        self.rows = rows
+        self.facets = facets
+        self.truncated = truncated
+        # Whether the ids come from typo-tolerant matching
+        self.fuzzy = fuzzy
+
+    def page(self, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+        """KeysetPage at a cursor, or None when the cursor lies past the cached ids"""
+        start = 0
+        position = decode_cursor(cursor, self.sort_by) if cursor else None
+        if position is not None:
+            ids = [product_id for product_id, _ in self.rows]
+            if position[1] not in ids:
+                return None
+            start = ids.index(position[1]) + 1
+        if start >= len(self.rows) and self.truncated:
+            return None
+
+        rows = self.rows[start:start + per_page]
+        next_cursor = None
+        if rows and (start + per_page < len(self.rows) or self.truncated):
+            last_id, last_value = rows[-1]
+            next_cursor = encode_cursor(self.sort_by, last_value, last_id)
+        return KeysetPage(hydrate_cards([product_id for product_id, _ in rows]), next_cursor)
+
+
+def cached_search(key, build, sort_by):
+    """SearchResults for a key; build() returns (ordered queryset, facets, fuzzy) on a miss"""
+    results = cache.get(key)
+    if results is None:
+        queryset, facets, fuzzy = build()
+        field, _ = SORT_ORDERS[sort_by]
+        limit = getattr(settings, 'SEARCH_CACHE_MAX_RESULTS', 500)
+        rows = list(queryset.values_list('id', field)[:limit + 1])
+        results = SearchResults(sort_by, rows[:limit], facets, truncated=len(rows) > limit, fuzzy=fuzzy)
+        cache.set(key, results, _timeout())
+    return results
+
+
+def hydrate_cards(product_ids):
+    """Card projections of the given products, in order, from the cache where possible"""
+    version = get_catalog_version()
+    keys = {product_id: f'card:{version}:{product_id}' for product_id in product_ids}
+    found = cache.get_many(keys.values())
+    cards = {product_id: found[key] for product_id, key in keys.items() if key in found}
+
+    missing = [product_id for product_id in product_ids if product_id not in cards]
+    if missing:
+        loaded = Product.objects.cards().filter(is_active=True).in_bulk(missing)
+        cache.set_many({keys[product_id]: product for product_id, product in loaded.items()}, _timeout())
+        cards.update(loaded)
+    return [cards[product_id] for product_id in product_ids if product_id in cards]
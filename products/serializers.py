@@ -0,0 +1,71 @@
+from rest_framework import serializers
+
+from .images import IMAGE_VARIANTS
+from .models import Product, Category
+
+
+def requested_fields(request):
+    """Field names asked for with ?fields=id,name,price, or None for all"""
+    if request is None:
+        return None
+    value = request.query_params.get('fields', '')
+    names = {name.strip() for name in value.split(',') if name.strip()}
+    return names or None
+
+
+class SparseFieldsMixin:
+    """Leave out every field the request did not ask for in ?fields="""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = requested_fields(self.context.get('request'))
+        if names:
+            for name in set(self.fields) - names:
+                self.fields.pop(name)
+    
+    @classmethod
+    def columns_for(cls, names):
+        """Model columns needed to serialize the given fields"""
+        columns = set()
+        for name in names & set(cls.Meta.fields):
+            columns.update(cls.Meta.source_columns.get(name, (name,)))
+        return columns
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    discount_percentage = serializers.ReadOnlyField()
+    in_stock = serializers.ReadOnlyField()
+    image_urls = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Product
+        # image_base64 is never sent, images are fetched from image_urls
+        fields = [
+            'id', 'name', 'slug', 'description', 'price', 'old_price', 'discount_percentage',
+            'stock', 'in_stock', 'category', 'brand', 'is_featured', 'image_urls',
+            'rating_avg', 'rating_count', 'rating_histogram', 'created_at', 'updated_at',
+        ]
+        # Columns behind the computed fields, for loading only what is asked for
+        source_columns = {
+            'discount_percentage': ('price', 'old_price'),
+            'in_stock': ('stock',),
+            'image_urls': ('image_hash',),
+        }
+    
+    def get_image_urls(self, obj):
+        if not obj.image_hash:
+            return None
+        request = self.context.get('request')
+        absolute = request.build_absolute_uri if request else str
+        urls = {variant: absolute(obj.get_image_url(variant)) for variant in IMAGE_VARIANTS}
+        urls['original'] = absolute(obj.get_image_url())
+        return urls
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product_count = serializers.IntegerField(source='active_product_count', read_only=True)
+    
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'description', 'icon', 'product_count', 'updated_at']
+        source_columns = {'product_count': ('active_product_count',)}
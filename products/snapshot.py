@@ -0,0 +1,273 @@
+"""
+In-process read-only snapshot of the catalog.
+
+With CATALOG_SNAPSHOT = True each worker keeps a compact copy of the
+active products, the categories and the brands, and the catalog views
+filter, sort and paginate against it instead of querying the database.
+Full-text searches and the parts of product_detail that the snapshot
+does not hold still go to the database.
+
+The snapshot belongs to one catalog version (see products/cache.py).
+When the version moves, or the snapshot is older than
+CATALOG_SNAPSHOT_MAX_AGE seconds, one thread builds a new snapshot while
+the others keep serving the old one, then it is swapped in whole.
+Catalogs larger than CATALOG_SNAPSHOT_MAX_PRODUCTS are not snapshotted
+and the views fall back to the database.
+"""
+
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+from .cache import get_catalog_version
+from .facets import count_facets, price_bucket
+from .models import Brand, Category, Product
+from .pagination import DEFAULT_PAGE_SIZE, SORT_ORDERS, KeysetPage, decode_cursor, encode_cursor
+
+PRODUCT_FIELDS = (
+    'id', 'name', 'slug', 'price', 'old_price', 'stock', 'category_id', 'brand_id',
+    'is_featured', 'image_hash', 'created_at', 'updated_at', 'rating_avg', 'rating_count',
+)
+
+
+class ProductRecord:
+    __slots__ = PRODUCT_FIELDS + ('summary',)
+
+    def __init__(self, summary, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.summary = summary
+
+    @property
+    def pk(self):
+        return self.id
+
+    # Same card behaviour as the model
+    discount_percentage = Product.discount_percentage
+    in_stock = Product.in_stock
+    rating_stars = Product.rating_stars
+    get_image_url = Product.get_image_url
+
+
+class CategoryRecord:
+    __slots__ = ('id', 'name', 'slug', 'description', 'icon', 'is_active', 'active_product_count')
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class BrandRecord:
+    __slots__ = ('id', 'name', 'slug')
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __str__(self):
+        return self.name
+
+
+class CatalogSnapshot:
+    __slots__ = ('version', 'built_at', 'products', 'categories', 'category_slugs',
+                 'brands', 'by_category', 'orders')
+
+    def __init__(self, version, products, categories, brands):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.products = {product.id: product for product in products}
+        self.categories = categories
+        self.category_slugs = {category.slug: category for category in categories}
+        self.brands = {brand.id: brand for brand in brands}
+
+        self.by_category = defaultdict(set)
+        for product in products:
+            self.by_category[product.category_id].add(product.id)
+
+        # Every sort order keeps one ascending (value, id) list; descending
+        # orders walk it backwards
+        self.orders = {}
+        for field, _ in SORT_ORDERS.values():
+            if field in PRODUCT_FIELDS and field not in self.orders:
+                records = sorted(products, key=lambda product: (getattr(product, field), product.id))
+                keys = [(getattr(product, field), product.id) for product in records]
+                self.orders[field] = (keys, records)
+
+    @property
+    def age(self):
+        """Seconds since the snapshot was built"""
+        return time.monotonic() - self.built_at
+
+    def active_categories(self):
+        return [category for category in self.categories if category.is_active]
+
+    def category_by_slug(self, slug):
+        category = self.category_slugs.get(slug)
+        return category if category is not None and category.is_active else None
+
+    def newest(self, limit, predicate=None):
+        _, records = self.orders['created_at']
+        found = []
+        for product in reversed(records):
+            if predicate is None or predicate(product):
+                found.append(product)
+                if len(found) == limit:
+                    break
+        return found
+
+    def page(self, product_ids, sort_by, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+        """Keyset page of the given products, cursors compatible with KeysetPaginator"""
+        field, descending = SORT_ORDERS.get(sort_by, (None, False))
+        if field not in self.orders:
+            sort_by = 'newest'
+            field, descending = SORT_ORDERS[sort_by]
+        keys, records = self.orders[field]
+
+        position = decode_cursor(cursor, sort_by) if cursor else None
+        if descending:
+            start = bisect.bisect_left(keys, position) - 1 if position else len(keys) - 1
+            positions = range(start, -1, -1)
+        else:
+            start = bisect.bisect_right(keys, position) if position else 0
+            positions = range(start, len(keys))
+
+        rows = []
+        for index in positions:
+            if records[index].id in product_ids:
+                rows.append(records[index])
+                if len(rows) > per_page:
+                    break
+
+        next_cursor = None
+        if len(rows) > per_page:
+            rows = rows[:per_page]
+            last = rows[-1]
+            next_cursor = encode_cursor(sort_by, getattr(last, field), last.pk)
+        return KeysetPage(rows, next_cursor)
+
+    def listing(self, params, category_id, brand_id, in_stock_only, sort_by):
+        """Page and facets of product_list for a request without a search query"""
+        min_price = _to_decimal(params.get('min_price'))
+        max_price = _to_decimal(params.get('max_price'))
+        products = [
+            product for product in self.products.values()
+            if (min_price is None or product.price >= min_price)
+            and (max_price is None or product.price <= max_price)
+        ]
+
+        category_id = int(category_id) if category_id else None
+        brand_id = int(brand_id) if brand_id else None
+        facets = count_facets(self.facet_rows(products), category_id, brand_id, in_stock_only)
+
+        product_ids = {
+            product.id for product in products
+            if (category_id is None or product.category_id == category_id)
+            and (brand_id is None or product.brand_id == brand_id)
+            and (not in_stock_only or product.stock > 0)
+        }
+        return self.page(product_ids, sort_by, params.get('cursor')), facets
+
+    def facet_rows(self, products):
+        """Rows shaped like products.facets.facet_rows()"""
+        groups = Counter(
+            (product.category_id, product.brand_id, price_bucket(product.price), int(product.stock > 0))
+            for product in products
+        )
+        categories = {category.id: category for category in self.categories}
+        rows = []
+        for (category_id, brand_id, bucket, has_stock), count in groups.items():
+            category = categories.get(category_id)
+            brand = self.brands.get(brand_id)
+            rows.append({
+                'category_id': category_id,
+                'category__name': category.name if category else '',
+                'category__slug': category.slug if category else '',
+                'brand_id': brand_id,
+                'brand__name': brand.name if brand else None,
+                'price_bucket': bucket,
+                'has_stock': has_stock,
+                'count': count,
+            })
+        return rows
+
+
+def build_snapshot(version, max_products):
+    """Load the catalog into a new snapshot, or None if it has too many products"""
+    active = Product.objects.filter(is_active=True)
+    if active.count() > max_products:
+        return None
+
+    products = [
+        ProductRecord(**row)
+        for row in active.cards().values(*PRODUCT_FIELDS, 'summary').iterator()
+    ]
+    categories = [
+        CategoryRecord(**row)
+        for row in Category.objects.values(*CategoryRecord.__slots__)
+    ]
+    brands = [BrandRecord(**row) for row in Brand.objects.values(*BrandRecord.__slots__)]
+    return CatalogSnapshot(version, products, categories, brands)
+
+
+class _State:
+    snapshot = None
+    # Version at which the catalog was found too large to snapshot
+    oversized_version = None
+
+
+_state = _State()
+_build_lock = threading.Lock()
+
+
+def _needs_build(snapshot, version):
+    max_age = getattr(settings, 'CATALOG_SNAPSHOT_MAX_AGE', 600)
+    return snapshot is None or snapshot.version != version or snapshot.age > max_age
+
+
+def get_snapshot():
+    """The current snapshot, or None when snapshot mode is off or unavailable"""
+    if not getattr(settings, 'CATALOG_SNAPSHOT', False):
+        return None
+
+    version = get_catalog_version()
+    snapshot = _state.snapshot
+    if not _needs_build(snapshot, version):
+        return snapshot
+    if snapshot is None and _state.oversized_version == version:
+        return None
+
+    # Whoever holds the lock rebuilds; the rest keep serving the old snapshot
+    if _build_lock.acquire(blocking=snapshot is None):
+        try:
+            if _needs_build(_state.snapshot, version):
+                max_products = getattr(settings, 'CATALOG_SNAPSHOT_MAX_PRODUCTS', 20000)
+                _state.snapshot = build_snapshot(version, max_products)
+                _state.oversized_version = version if _state.snapshot is None else None
+        finally:
+            _build_lock.release()
+    return _state.snapshot
+
+
+def add_snapshot_headers(response, snapshot):
+    """Tell how old the data behind a response is"""
+    response['X-Catalog-Snapshot-Age'] = f'{snapshot.age:.0f}'
+    response['X-Catalog-Snapshot-Version'] = str(snapshot.version)
+    return response
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(value) if value else None
+    except (InvalidOperation, TypeError):
+        return None
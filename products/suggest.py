@@ -0,0 +1,170 @@
+"""
+In-process prefix index for search-as-you-type suggestions.
+
+Entries live in one sorted list of (key, kind, id, label) tuples, so a
+lookup is a bisect to the first key with the typed prefix followed by a
+short forward scan. Every word of a name starts a key, so "gal" finds
+"Samsung Galaxy S23".
+
+Each worker builds its index when it starts (warm_up(), called from
+wsgi.py), or otherwise on the first suggestion request, and keeps it in
+step with its own Product saves through signals. A save changes the list
+in place under the index lock, which lookups hold too. Changes made by
+other workers are picked up by a full rebuild once the index is older
+than SUGGEST_INDEX_TTL seconds.
+"""
+
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .search import tokenize
+
+# Lower kinds are suggested first
+CATEGORY, BRAND, PRODUCT = 0, 1, 2
+KIND_NAMES = {CATEGORY: 'category', BRAND: 'brand', PRODUCT: 'product'}
+
+MAX_LABEL_LENGTH = 80
+MAX_WORDS_PER_NAME = 6
+
+
+def _keys_for(name):
+    """One key per word start: 'samsung galaxy s23', 'galaxy s23', 's23'"""
+    words = tokenize(name)[:MAX_WORDS_PER_NAME]
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class PrefixIndex:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = []
+        self.product_keys = {}
+        self.built_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def stale(self):
+        ttl = getattr(settings, 'SUGGEST_INDEX_TTL', 300)
+        return self.built_at is None or time.monotonic() - self.built_at > ttl
+
+    def build(self):
+        from .models import Category, Brand, Product
+
+        entries = []
+        for kind, queryset in (
+            (CATEGORY, Category.objects.filter(is_active=True)),
+            (BRAND, Brand.objects.all()),
+        ):
+            for obj_id, name in queryset.values_list('id', 'name').iterator():
+                label = name[:MAX_LABEL_LENGTH]
+                entries.extend((key, kind, obj_id, label) for key in _keys_for(name))
+
+        # Newest products win when the catalog outgrows the index
+        product_keys = {}
+        products = Product.objects.filter(is_active=True).order_by('-created_at').values_list('id', 'name')
+        for product_id, name in products.iterator():
+            keys = _keys_for(name)
+            if len(entries) + len(keys) > self.max_entries:
+                break
+            label = name[:MAX_LABEL_LENGTH]
+            entries.extend((key, PRODUCT, product_id, label) for key in keys)
+            product_keys[product_id] = (keys, label)
+
+        entries.sort()
+        with self.lock:
+            self.entries = entries
+            self.product_keys = product_keys
+            self.built_at = time.monotonic()
+
+    def update_product(self, product_id, name=None, is_active=False):
+        """Replace one product's entries; call with is_active=False to drop it"""
+        if self.built_at is None:
+            return
+        with self.lock:
+            entries = self.entries
+            old_keys, old_label = self.product_keys.pop(product_id, ((), None))
+            for key in old_keys:
+                position = bisect.bisect_left(entries, (key, PRODUCT, product_id))
+                if position < len(entries) and entries[position][:3] == (key, PRODUCT, product_id):
+                    del entries[position]
+            if is_active and name:
+                keys = _keys_for(name)
+                if len(entries) + len(keys) <= self.max_entries:
+                    label = name[:MAX_LABEL_LENGTH]
+                    for key in keys:
+                        bisect.insort(entries, (key, PRODUCT, product_id, label))
+                    self.product_keys[product_id] = (keys, label)
+
+    def invalidate(self):
+        self.built_at = None
+
+    def search(self, query, limit=8):
+        prefix = ' '.join(tokenize(query))
+        if not prefix:
+            return []
+        seen, candidates = set(), []
+        with self.lock:
+            entries = self.entries
+            position = bisect.bisect_left(entries, (prefix,))
+            # Look a little past the limit so categories and brands can outrank products
+            while position < len(entries) and len(candidates) < limit * 4:
+                key, kind, obj_id, label = entries[position]
+                if not key.startswith(prefix):
+                    break
+                if (kind, obj_id) not in seen:
+                    seen.add((kind, obj_id))
+                    # Names that start with the prefix beat mid-name matches
+                    starts_name = label.lower().startswith(prefix)
+                    candidates.append((kind, not starts_name, len(label), label, obj_id))
+                position += 1
+        candidates.sort()
+        return [(kind, obj_id, label) for kind, _, _, label, obj_id in candidates[:limit]]
+
+
+_index = PrefixIndex(max_entries=getattr(settings, 'SUGGEST_INDEX_MAX_ENTRIES', 300000))
+_build_lock = threading.Lock()
+
+
+def get_index():
+    if _index.stale:
+        with _build_lock:
+            if _index.stale:
+                _index.build()
+    return _index
+
+
+def _warm_up():
+    try:
+        get_index()
+    except DatabaseError:
+        # Tables not migrated yet, the first suggestion request builds it
+        pass
+    finally:
+        # The thread opened its own database connection
+        connections.close_all()
+
+
+def warm_up():
+    """Build the index in the background so no request waits for it"""
+    threading.Thread(target=_warm_up, daemon=True).start()
+
+
+def suggest(query, limit=8):
+    """Return (kind name, id, label) suggestions for a typed prefix"""
+    return [(KIND_NAMES[kind], obj_id, label) for kind, obj_id, label in get_index().search(query, limit)]
+
+
+def product_changed(product):
+    _index.update_product(product.pk, product.name, product.is_active)
+
+
+def product_removed(product_id):
+    _index.update_product(product_id)
+
+
+def catalog_changed():
+    """Category and brand edits are rare, rebuild on the next request"""
+    _index.invalidate()
@@ -0,0 +1,15 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def image_url(obj, variant):
+    """URL of a named image variant, e.g. {{ product|image_url:"card.webp" }}
+
+    The format defaults to JPEG when only the size name is given.
+    """
+    if not obj or not hasattr(obj, 'get_image_url'):
+        return ''
+    size, _, format_str = variant.partition('.')
+    return obj.get_image_url(size, format_str or 'jpeg') or ''
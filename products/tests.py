@@ -1,3 +1,146 @@
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.utils import timezone
+
+from .cache import bump_catalog_version, get_catalog_version
+from .models import Product, Category, Brand
+from .pagination import KeysetPaginator, encode_cursor
+
+# sort_by values that the catalog pages offer without a search query
+LISTING_SORTS = ('newest', 'price_low', 'price_high', 'name', 'rating')
+
+
+class CatalogQueryPlanTests(TestCase):
+    """Every catalog query shape must be answered from an index.
+
+    Runs EXPLAIN against a seeded catalog big enough that the planner
+    picks an index whenever a usable one exists, and fails on a
+    sequential scan of products_product.
+    """
+    PRODUCTS = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = Category.objects.bulk_create(
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(20)
+        )
+        brands = Brand.objects.bulk_create(Brand(name=f'Brand {i}', slug=f'brand-{i}') for i in range(50))
+        now = timezone.now()
+        Product.objects.bulk_create(
+            (
+                Product(
+                    category=categories[i % len(categories)],
+                    brand=brands[i % len(brands)],
+                    name=f'Product {i}',
+                    slug=f'product-{i}',
+                    price=Decimal(100 + (i * 37) % 90000),
+                    stock=i % 7,
+                    is_active=i % 10 != 0,
+                    is_featured=i % 100 == 1,
+                    created_at=now - timedelta(minutes=i),
+                )
+                for i in range(cls.PRODUCTS)
+            ),
+            batch_size=2000,
+        )
+        cls.category = categories[3]
+        cls.brand = brands[7]
+        cls.middle = Product.objects.filter(is_active=True).order_by('-created_at')[cls.PRODUCTS // 2]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, sorted_by_index=True):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            full_scan = re.search(r'Seq Scan on products_product\b', plan)
+        elif connection.vendor == 'sqlite':
+            full_scan = re.search(r'SCAN products_product(?! USING)', plan)
+        else:
+            self.skipTest(f'No plan check for {connection.vendor}')
+        self.assertIsNone(full_scan, f'Sequential scan for\n{queryset.query}\n{plan}')
+        if sorted_by_index and connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plan, f'Sort not served by an index for\n{queryset.query}\n{plan}')
+
+    def listing(self, sort_by, cursor=None, **filters):
+        """The query product_list / category_detail run for one page"""
+        paginator = KeysetPaginator(Product.objects.cards().filter(is_active=True, **filters), sort_by)
+        return paginator.after(cursor)[:paginator.per_page + 1]
+
+    def cursor_at(self, product, sort_by):
+        field = KeysetPaginator(Product.objects.none(), sort_by).field
+        return encode_cursor(sort_by, getattr(product, field), product.pk)
+
+    def test_product_list(self):
+        for sort_by in LISTING_SORTS:
+            with self.subTest(sort_by=sort_by):
+                self.assertUsesIndex(self.listing(sort_by))
+
+    def test_product_list_later_page(self):
+        for sort_by in LISTING_SORTS:
+            with self.subTest(sort_by=sort_by):
+                self.assertUsesIndex(self.listing(sort_by, self.cursor_at(self.middle, sort_by)))
+
+    def test_category_detail(self):
+        for sort_by in ('newest', 'price_low', 'price_high'):
+            with self.subTest(sort_by=sort_by):
+                self.assertUsesIndex(self.listing(sort_by, category=self.category))
+                self.assertUsesIndex(
+                    self.listing(sort_by, self.cursor_at(self.middle, sort_by), category=self.category)
+                )
+
+    def test_brand_filter(self):
+        self.assertUsesIndex(self.listing('newest', brand=self.brand))
+
+    def test_price_range(self):
+        self.assertUsesIndex(self.listing('price_low', price__gte=1000, price__lte=5000))
+        self.assertUsesIndex(self.listing('price_high', price__gte=1000, price__lte=5000))
+
+    def test_home_sections(self):
+        featured = Product.objects.cards().filter(is_featured=True, is_active=True).order_by('-created_at')[:8]
+        new_arrivals = Product.objects.cards().filter(is_active=True).order_by('-created_at')[:8]
+        self.assertUsesIndex(featured)
+        self.assertUsesIndex(new_arrivals)
+
+
+class ProductApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Phones', slug='phones')
+        cls.old = Product.objects.create(category=category, name='Old phone', slug='old-phone', price=100)
+        cls.new = Product.objects.create(category=category, name='New phone', slug='new-phone', price=200)
+        Product.objects.filter(pk=cls.old.pk).update(updated_at=timezone.now() - timedelta(days=10))
+
+    def test_updated_since(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.client.get('/api/products/', {'updated_since': since, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.new.pk])
+
+    def test_invalid_updated_since(self):
+        response = self.client.get('/api/products/', {'updated_since': '2024-13-45T00:00:00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('updated_since', response.json())
+
+
+class CategoryDetailTests(TestCase):
+    def test_sort_without_search_falls_back_to_newest(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        Product.objects.create(category=category, name='Phone', slug='phone', price=100)
+        for sort_by in ('relevance', 'bogus'):
+            with self.subTest(sort_by=sort_by):
+                response = self.client.get(f'/products/category/phones/?sort_by={sort_by}')
+                self.assertEqual(response.status_code, 200)
+
 
-# Create your tests here.
+class CatalogVersionTests(TestCase):
+    def test_version_outlives_the_local_cache(self):
+        """Workers share the version, clearing one process's cache keeps it"""
+        version = get_catalog_version()
+        bump_catalog_version()
+        cache.clear()
+        self.assertEqual(get_catalog_version(), version + 1)
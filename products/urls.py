@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('', views.product_list, name='product_list'),
+    path('suggest/', views.product_suggest, name='product_suggest'),
     path('product/<int:product_id>/', views.product_detail, name='product_detail'),  # Changed from pk to product_id
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
+    path('image/<str:image_hash>/', views.product_image, name='product_image'),
+    path('image/<str:image_hash>/<slug:variant>.<slug:format_str>', views.product_image_variant, name='product_image_variant'),
 ]
\ No newline at end of file
@@ -1,78 +1,287 @@
+import base64
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
-from .models import Product, Category
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag, require_safe
+from .models import Product, Category, ProductImage, ImageBlob
+from .images import DECODE_ERRORS, IMAGE_VARIANTS, VARIANT_FORMATS
+from .search import fuzzy_search_products, search_products
+from .pagination import SORT_ORDERS, KeysetPaginator
+from .facets import compute_facets, count_facets, facet_rows
+from .suggest import suggest
+from .cache import cached_listing, listing_cache_key
+from .snapshot import get_snapshot, add_snapshot_headers
+from .search_cache import cached_search, normalize_price, search_cache_key
 
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
-    categories = Category.objects.filter(is_active=True)
-    
-    # Search
     query = request.GET.get('q')
-    if query:
-        products = products.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+    category_id = request.GET.get('category', '')
+    brand_id = request.GET.get('brand', '')
+    in_stock_only = request.GET.get('in_stock') == '1'
+    category_id = category_id if category_id.isdigit() else None
+    brand_id = brand_id if brand_id.isdigit() else None
     
-    # Category filter
-    category_id = request.GET.get('category')
-    if category_id:
-        products = products.filter(category_id=category_id)
+    # Sorting - searches default to relevance
+    sort_by = request.GET.get('sort_by') or ('relevance' if query else 'newest')
+    if sort_by == 'relevance' and not query:
+        sort_by = 'newest'
     
-    # Price filter
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
+    if sort_by not in SORT_ORDERS:
+        sort_by = 'newest'
+    cursor = request.GET.get('cursor')
+    fuzzy = False
     
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
+    def filtered(fuzzy=False):
+        """The searched and price filtered products, and those narrowed by the facet selections"""
+        products = Product.objects.cards().filter(is_active=True)
+        
+        # Search
+        if fuzzy:
+            products = fuzzy_search_products(products, query)
+        elif query:
+            products = search_products(products, query)
+        
+        # Price filter
+        min_price = normalize_price(request.GET.get('min_price'))
+        max_price = normalize_price(request.GET.get('max_price'))
+        
+        if min_price is not None:
+            products = products.filter(price__gte=min_price)
+        if max_price is not None:
+            products = products.filter(price__lte=max_price)
+        
+        narrowed = products
+        if category_id:
+            narrowed = narrowed.filter(category_id=category_id)
+        if brand_id:
+            narrowed = narrowed.filter(brand_id=brand_id)
+        if in_stock_only:
+            narrowed = narrowed.filter(stock__gt=0)
+        return products, narrowed
     
-    # Sorting
-    sort_by = request.GET.get('sort_by', 'newest')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'name':
-        products = products.order_by('name')
-    else:  # newest
-        products = products.order_by('-created_at')
+    def build():
+        products, narrowed = filtered()
+        page = KeysetPaginator(narrowed, sort_by).page(cursor)
+        # Facet counts leave out the category, brand and stock selections
+        facets = compute_facets(products, category_id, brand_id, in_stock_only)
+        return page, facets, _active_categories()
+    
+    def build_search():
+        fuzzy = False
+        products, narrowed = filtered()
+        rows = facet_rows(products)
+        if not rows:
+            # Nothing matched as typed, retry tolerating typos
+            fuzzy = True
+            products, narrowed = filtered(fuzzy)
+            rows = facet_rows(products)
+        facets = count_facets(rows, category_id, brand_id, in_stock_only)
+        return KeysetPaginator(narrowed, sort_by).ordered(), facets, fuzzy
+    
+    snapshot = None if query else get_snapshot()
+    if snapshot is not None:
+        page, facets = snapshot.listing(request.GET, category_id, brand_id, in_stock_only, sort_by)
+        categories = snapshot.active_categories()
+    elif query:
+        # Searches cache their ordered ids; a page loads only the products it shows
+        results = cached_search(search_cache_key(query, request.GET, sort_by), build_search, sort_by)
+        page = results.page(cursor)
+        if page is None:
+            page = KeysetPaginator(filtered(results.fuzzy)[1], sort_by).page(cursor)
+        facets = results.facets
+        categories = _active_categories()
+        fuzzy = results.fuzzy
+    else:
+        page, facets, categories = cached_listing(listing_cache_key('products', request.GET), build)
+    
+    # Infinite scroll fetches the next page as JSON
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return _with_snapshot_headers(_product_page_json(request, page), snapshot)
     
     context = {
-        'products': products,
+        'products': page,
+        'page': page,
+        'next_page_url': _next_page_url(request, page),
         'categories': categories,
+        'facets': facets,
         'search_query': query,
+        'fuzzy_search': fuzzy,
     }
-    return render(request, 'products/product_list.html', context)
+    return _with_snapshot_headers(render(request, 'products/product_list.html', context), snapshot)
+
+
+def product_suggest(request):
+    """Typeahead suggestions for the search box"""
+    query = request.GET.get('q', '')[:100]
+    suggestions = []
+    for kind, obj_id, label in suggest(query):
+        if kind == 'category':
+            url = f"{reverse('product_list')}?category={obj_id}"
+        elif kind == 'brand':
+            url = f"{reverse('product_list')}?brand={obj_id}"
+        else:
+            url = reverse('product_detail', args=[obj_id])
+        suggestions.append({'type': kind, 'label': label, 'url': url})
+    return JsonResponse({'query': query, 'suggestions': suggestions})
 
-from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
-from .models import Product, Category
 
 def product_detail(request, product_id):  # Change parameter name
     product = get_object_or_404(Product, id=product_id, is_active=True)
     
-    # Get related products
-    related_products = Product.objects.filter(
-        category=product.category,
-        is_active=True
-    ).exclude(id=product_id)[:4]
+    # Frequently bought together, topped up from the same category
+    related_products = list(
+        Product.objects.cards().filter(
+            co_purchased_by__product=product,
+            co_purchased_by__rank__isnull=False,
+            is_active=True,
+        ).order_by('co_purchased_by__rank')[:4]
+    )
+    if len(related_products) < 4:
+        exclude_ids = [product_id] + [p.id for p in related_products]
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            related_products += snapshot.newest(
+                4 - len(related_products),
+                lambda p: p.category_id == product.category_id and p.id not in exclude_ids,
+            )
+        else:
+            related_products += Product.objects.cards().filter(
+                category=product.category,
+                is_active=True
+            ).exclude(id__in=exclude_ids)[:4 - len(related_products)]
     
     context = {
         'product': product,
         'related_products': related_products,
+        # The rating summary comes from the product itself
+        'reviews': list(product.reviews.select_related('user')),
     }
     return render(request, 'products/product_detail.html', context)
     
     
 def category_detail(request, slug):
-    category = get_object_or_404(Category, slug=slug, is_active=True)
-    products = Product.objects.filter(category=category, is_active=True)
+    # No search here, so relevance has nothing to rank by
+    sort_by = request.GET.get('sort_by', 'newest')
+    if sort_by == 'relevance' or sort_by not in SORT_ORDERS:
+        sort_by = 'newest'
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        category = snapshot.category_by_slug(slug)
+        if category is None:
+            raise Http404("Category not found")
+        page = snapshot.page(snapshot.by_category.get(category.id, set()), sort_by, request.GET.get('cursor'))
+    else:
+        category = get_object_or_404(Category, slug=slug, is_active=True)
+        products = Product.objects.cards().filter(category=category, is_active=True)
+        page = cached_listing(
+            listing_cache_key('category', request.GET, category.pk),
+            lambda: KeysetPaginator(products, sort_by).page(request.GET.get('cursor')),
+        )
+    
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return _with_snapshot_headers(_product_page_json(request, page), snapshot)
     
     context = {
         'category': category,
-        'products': products,
+        'products': page,
+        'page': page,
+        'next_page_url': _next_page_url(request, page),
     }
-    return render(request, 'products/category_detail.html', context)
\ No newline at end of file
+    return _with_snapshot_headers(render(request, 'products/category_detail.html', context), snapshot)
+
+
+def _active_categories():
+    return cached_listing(
+        listing_cache_key('categories', QueryDict()),
+        lambda: list(Category.objects.filter(is_active=True)),
+    )
+
+
+def _with_snapshot_headers(response, snapshot):
+    return add_snapshot_headers(response, snapshot) if snapshot is not None else response
+
+
+def _next_page_url(request, page):
+    """Current URL with the cursor swapped for the next page's"""
+    if not page.has_next:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = page.next_cursor
+    return f"{request.path}?{params.urlencode()}"
+
+
+def _product_page_json(request, page):
+    return JsonResponse({
+        'products': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'slug': product.slug,
+                'price': str(product.price),
+                'old_price': str(product.old_price) if product.old_price else None,
+                'discount_percentage': product.discount_percentage,
+                'in_stock': product.in_stock,
+                'rating_avg': str(product.rating_avg),
+                'rating_count': product.rating_count,
+                'image_url': product.get_image_url('card'),
+                'url': reverse('product_detail', args=[product.id]),
+            }
+            for product in page
+        ],
+        'has_next': page.has_next,
+        'next_cursor': page.next_cursor,
+        'next_url': _next_page_url(request, page),
+    })
+
+
+@require_safe
+@cache_control(public=True, max_age=31536000, immutable=True)
+@etag(lambda request, image_hash: image_hash)
+def product_image(request, image_hash):
+    """Serve raw image bytes addressed by their content hash.
+
+    The URL changes whenever the image changes, so browsers may keep the
+    response forever and revalidation is answered from the ETag alone.
+    """
+    image_data, format_str = _load_original_image(image_hash)
+    return HttpResponse(image_data, content_type=f"image/{format_str}")
+
+
+@require_safe
+@cache_control(public=True, max_age=31536000, immutable=True)
+@etag(lambda request, image_hash, variant, format_str: f"{image_hash}-{variant}.{format_str}")
+def product_image_variant(request, image_hash, variant, format_str):
+    """Serve a resized variant of an image.
+
+    Variants are rendered at upload time; images uploaded before the
+    pipeline existed get the requested one rendered on first request.
+    """
+    if variant not in IMAGE_VARIANTS or format_str not in VARIANT_FORMATS:
+        raise Http404("Unknown image variant")
+    
+    blob = ImageBlob.objects.filter(image_hash=image_hash, variant=variant, format=format_str).first()
+    if blob is not None:
+        return HttpResponse(bytes(blob.data), content_type=f"image/{format_str}")
+    
+    try:
+        image_data, _ = _load_original_image(image_hash)
+        data = ImageBlob.create_variant(image_hash, image_data, variant, format_str)
+    except DECODE_ERRORS:
+        raise Http404("Image cannot be decoded")
+    return HttpResponse(data, content_type=f"image/{format_str}")
+
+
+def _load_original_image(image_hash):
+    """Return (bytes, format) of the original image with this hash"""
+    blob = ImageBlob.objects.filter(image_hash=image_hash, variant=ImageBlob.ORIGINAL).first()
+    if blob is not None:
+        return bytes(blob.data), blob.format
+    
+    image = (
+        Product.objects.filter(image_hash=image_hash).values('image_base64', 'image_format').first()
+        or ProductImage.objects.filter(image_hash=image_hash).values('image_base64', 'image_format').first()
+    )
+    if not image or not image['image_base64']:
+        raise Http404("Image not found")
+    return base64.b64decode(image['image_base64']), image['image_format'] or 'jpeg'
@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from products.models import Product
+from products.ratings import change_rating
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 class Review(models.Model):
@@ -24,4 +27,9 @@ class Review(models.Model):
     @property
     def stars(self):
         """Return star rating as list"""
-        return range(self.rating)
\ No newline at end of file
+        return range(self.rating)
+
+# Deleting a review (admin, account removal) takes its rating back off the product
+@receiver(post_delete, sender=Review)
+def uncount_deleted_review(sender, instance, **kwargs):
+    change_rating(instance.product_id, old_rating=instance.rating)
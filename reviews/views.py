@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from products.models import Product
+from products.ratings import change_rating
 from .models import Review
 from orders.models import OrderItem
 
@@ -24,28 +26,38 @@ def submit_review(request, product_id):
     existing_review = Review.objects.filter(product=product, user=request.user).first()
     
     if request.method == 'POST':
-        rating = request.POST.get('rating', 5)
+        rating = request.POST.get('rating', '5')
         comment = request.POST.get('comment', '').strip()
         
+        if rating not in ('1', '2', '3', '4', '5'):
+            messages.error(request, 'Please choose a rating from 1 to 5 stars.')
+            return redirect('submit_review', product_id=product_id)
+        rating = int(rating)
+        
         if not comment:
             messages.error(request, 'Please write a review comment.')
             return redirect('submit_review', product_id=product_id)
         
-        if existing_review:
-            # Update existing review
-            existing_review.rating = rating
-            existing_review.comment = comment
-            existing_review.save()
-            messages.success(request, 'Review updated successfully!')
-        else:
-            # Create new review
-            Review.objects.create(
-                product=product,
-                user=request.user,
-                rating=rating,
-                comment=comment
-            )
-            messages.success(request, 'Thank you for your review!')
+        # The review and the product's rating aggregates change together
+        with transaction.atomic():
+            if existing_review:
+                # Update existing review
+                old_rating = existing_review.rating
+                existing_review.rating = rating
+                existing_review.comment = comment
+                existing_review.save()
+                change_rating(product.id, old_rating, rating)
+                messages.success(request, 'Review updated successfully!')
+            else:
+                # Create new review
+                Review.objects.create(
+                    product=product,
+                    user=request.user,
+                    rating=rating,
+                    comment=comment
+                )
+                change_rating(product.id, new_rating=rating)
+                messages.success(request, 'Thank you for your review!')
         
         return redirect('product_detail', product_id=product_id)
     
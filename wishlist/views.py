@@ -9,7 +9,9 @@ from .models import Wishlist, WishlistItem
 def wishlist_view(request):
     """View user's wishlist"""
     wishlist, created = Wishlist.objects.get_or_create(user=request.user)
-    wishlist_items = wishlist.items.select_related('product').all()
+    wishlist_items = wishlist.items.select_related('product').defer(
+        'product__image_base64', 'product__description'
+    )
     
     context = {
         'wishlist': wishlist,